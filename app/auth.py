@@ -1,7 +1,10 @@
 class OidcClient:
-    def __init__(self, client_id, client_secret, authority_url, redirect_url, frontend_url):
+    def __init__(self, client_id, client_secret, authority_url, redirect_url, frontend_url, issuer, audience):
         self.client_id = client_id
         self.client_secret = client_secret
         self.authority_url = authority_url
         self.redirect_url = redirect_url
         self.frontend_url = frontend_url
+        # Expected iss and aud claims of id tokens
+        self.issuer = issuer
+        self.audience = audience
@@ -1,5 +1,4 @@
 import uuid
-import httpx
 from fastapi import APIRouter, Request, HTTPException, status
 from fastapi.responses import RedirectResponse
 
@@ -17,17 +16,18 @@ async def login(request: Request):
 @router.get("/callback")
 async def callback(request: Request, code: str):
     # Exchange the authorization code for tokens.
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(
-            f"{request.app.auth.authority_url}/oidcAccessToken",
-            data={
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": request.app.auth.redirect_url,
-                "client_id": request.app.auth.client_id,
-                "client_secret": request.app.auth.client_secret,
-            },
-        )
+    # The shared client reuses connections to the provider and is timed on /metrics
+    client = request.app.state.http_client
+    token_response = await client.post(
+        f"{request.app.auth.authority_url}/oidcAccessToken",
+        data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": request.app.auth.redirect_url,
+            "client_id": request.app.auth.client_id,
+            "client_secret": request.app.auth.client_secret,
+        },
+    )
     token_data = token_response.json()
     if token_response.status_code != 200:
         raise HTTPException(
@@ -39,11 +39,10 @@ async def callback(request: Request, code: str):
     id_token = token_data.get("id_token")
 
     # Retrieve user info from the OIDC provider.
-    async with httpx.AsyncClient() as client:
-        user_response = await client.get(
-            f"{request.app.auth.authority_url}/oidcProfile",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+    user_response = await client.get(
+        f"{request.app.auth.authority_url}/oidcProfile",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
     user_info = user_response.json()
 
     # Prepare the payload (this could include additional data).
@@ -51,7 +50,7 @@ async def callback(request: Request, code: str):
 
     # Generate a short session ID and store the payload.
     session_id = str(uuid.uuid4())
-    request.app.state.session_store.set(session_id, payload)
+    await request.app.state.session_store.set(session_id, payload)
 
     # Redirect to the frontend.
     frontend_url = request.app.auth.frontend_url
@@ -71,17 +70,19 @@ async def callback(request: Request, code: str):
 @router.get("/current-user")
 async def current_user(request: Request):
     session_id = request.cookies.get("session_id")
-    if not session_id or session_id not in request.app.state.session_store:
+    session = await request.app.state.session_store.get(session_id) if session_id else None
+    if not session:
         raise HTTPException(status_code=401, detail="Unauthenticated")
-    return request.app.state.session_store.get(session_id)
+    return session
 @router.get("/logout")
 async def logout(request: Request):
     # Remove the session from the store
     session_id = request.cookies.get("session_id")
 
-    if session_id and session_id in request.app.state.session_store:
-        id_token = request.app.state.session_store.get(session_id).get("id_token")
-        request.app.state.session_store.delete(session_id)
+    session = await request.app.state.session_store.get(session_id) if session_id else None
+    if session:
+        id_token = session.get("id_token")
+        await request.app.state.session_store.delete(session_id)
         logout_url = (
             f"{request.app.auth.authority_url}/oidcLogout?id_token_hint={id_token}"
             f"&post_logout_redirect_uri={request.app.auth.frontend_url}"
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Callable, List
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Watches a collection's change stream and fans events out to in-memory caches.
+# Subscribers receive the raw change document, or {"operationType": "invalidate"}
+# whenever events may have been missed and everything derived should be dropped.
+class ChangeFeed:
+    RETRY_SECONDS = 5
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.active = False
+        self.subscribers: List[Callable[[dict], None]] = []
+        self._task = None
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        self.subscribers.append(callback)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.active = False
+
+    def dispatch(self, change: dict):
+        for callback in self.subscribers:
+            try:
+                callback(change)
+            except Exception:
+                logger.exception("Change feed subscriber failed on %s", change.get("operationType"))
+
+    async def _run(self):
+        while True:
+            try:
+                async with await self.collection.watch() as stream:
+                    self.active = True
+                    # Anything cached before the stream opened (first start, or the gap before a
+                    # reconnect) never sees the changes made meanwhile, so drop it once we're listening
+                    self.dispatch({"operationType": "invalidate"})
+                    async for change in stream:
+                        self.dispatch(change)
+            except OperationFailure as e:
+                # Change streams need a replica set or Atlas, caches fall back to their TTL
+                logger.warning("Change stream unavailable on %s: %s", self.collection.name, e)
+                self._lost()
+                return
+            except PyMongoError as e:
+                logger.warning("Change stream on %s interrupted, retrying: %s", self.collection.name, e)
+                self._lost()
+                await asyncio.sleep(self.RETRY_SECONDS)
+
+    def _lost(self):
+        if self.active:
+            self.active = False
+            self.dispatch({"operationType": "invalidate"})
@@ -0,0 +1,68 @@
+import re
+
+from botocore.exceptions import ClientError
+from fastapi import Request, HTTPException, status
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+BUCKET = "folklorearchive"
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=\d*-\d*$")
+
+class DownloadSettings:
+    def __init__(self, redirect: bool, presign_ttl: int, export_prefetch: int):
+        self.redirect = redirect
+        self.presign_ttl = presign_ttl
+        self.export_prefetch = export_prefetch
+
+# Headers forwarded from S3 so clients can cache, resume and seek within PDFs
+def object_headers(result: dict) -> dict:
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(result["ContentLength"]),
+        "ETag": result["ETag"],
+    }
+    if "LastModified" in result:
+        headers["Last-Modified"] = result["LastModified"].strftime("%a, %d %b %Y %H:%M:%S GMT")
+    if "ContentRange" in result:
+        headers["Content-Range"] = result["ContentRange"]
+    return headers
+
+# Proxies an object, mapping Range to a ranged GET (206) and If-None-Match to a 304
+async def stream_s3_object(request: Request, key: str) -> Response:
+    params = {"Bucket": BUCKET, "Key": key}
+    range_header = request.headers.get("range")
+    # Only single byte ranges map onto S3, anything else gets the full object
+    if range_header and RANGE_PATTERN.match(range_header) and range_header != "bytes=-":
+        params["Range"] = range_header
+    if if_none_match := request.headers.get("if-none-match"):
+        params["IfNoneMatch"] = if_none_match
+    try:
+        # boto3 is blocking, keep it off the event loop
+        result = await run_in_threadpool(request.app.s3.get_object, **params)
+    except ClientError as e:
+        raise_for_s3_error(e)
+    return StreamingResponse(
+        content=result["Body"].iter_chunks(CHUNK_SIZE),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if "ContentRange" in result else status.HTTP_200_OK,
+        media_type=result.get("ContentType") or "application/pdf",
+        headers=object_headers(result),
+    )
+
+# Sends the client straight to S3 so large PDFs never pass through the workers
+def presigned_redirect(request: Request, key: str, expires_in: int) -> RedirectResponse:
+    url = request.app.s3.generate_presigned_url(
+        "get_object", Params={"Bucket": BUCKET, "Key": key}, ExpiresIn=expires_in
+    )
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+def raise_for_s3_error(e: ClientError):
+    status_code = e.response["ResponseMetadata"]["HTTPStatusCode"]
+    if status_code == status.HTTP_304_NOT_MODIFIED:
+        # The object's current ETag as S3 reports it, If-None-Match may be a list or *
+        etag = e.response["ResponseMetadata"].get("HTTPHeaders", {}).get("etag")
+        raise HTTPException(status_code=status_code, headers={"ETag": etag} if etag else None)
+    error = e.response["Error"]
+    if error["Code"] in ("NoSuchKey", "404"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found in storage")
+    raise HTTPException(status_code=status_code, detail=error.get("Message", error["Code"]))
@@ -0,0 +1,141 @@
+import asyncio
+import csv
+import io
+import json
+import threading
+import zipfile
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from botocore.exceptions import ClientError
+from starlette.concurrency import run_in_threadpool
+
+from .downloads import BUCKET, CHUNK_SIZE
+from .models import FolkloreCollection
+
+# Unseekable sink for ZipFile, bytes are drained and sent as soon as they are written
+class ZipChunkWriter(io.RawIOBase):
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.buffer += b
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+def flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for k, v in value.items():
+            flat.update(flatten(v, f"{prefix}.{k}" if prefix else k))
+        return flat
+    if isinstance(value, list):
+        return {prefix: json.dumps(value)}
+    return {prefix: value}
+
+# Starts S3 GETs up to `prefetch` documents ahead of the one being written. Every Body is
+# closed once the consumer moves past it, or on exit if the client disconnects mid-export.
+async def prefetch_objects(s3, cursor, prefetch: int):
+    opened = set()
+    lock = threading.Lock()
+    finished = False
+
+    def get(key: str):
+        result = s3.get_object(Bucket=BUCKET, Key=key)
+        with lock:
+            if not finished:
+                opened.add(result["Body"])
+                return result
+        # Cancelled tasks abandon their thread, nobody is left to read this one
+        result["Body"].close()
+        return result
+
+    async def fetch(key: str):
+        try:
+            return await run_in_threadpool(get, key)
+        except ClientError as e:
+            return e
+
+    def release(result):
+        if isinstance(result, dict):
+            with lock:
+                opened.discard(result["Body"])
+            result["Body"].close()
+
+    pending = deque()
+    try:
+        async for doc in cursor:
+            if not doc.get("filename"):
+                continue
+            pending.append((doc, asyncio.ensure_future(fetch(doc["filename"]))))
+            if len(pending) > prefetch:
+                # Left queued until it completes so the cleanup below still cancels it
+                result = await pending[0][1]
+                yield pending.popleft()[0], result
+                release(result)
+        while pending:
+            result = await pending[0][1]
+            yield pending.popleft()[0], result
+            release(result)
+    finally:
+        for _, task in pending:
+            task.cancel()
+        with lock:
+            finished = True
+            bodies = list(opened)
+        for body in bodies:
+            body.close()
+
+# Streams a ZIP of a metadata manifest followed by every matching PDF. The cursor is
+# read twice (manifest, then files) so nothing proportional to the export is held.
+async def export_zip(open_cursor: Callable[[], Awaitable], s3, manifest_format: str = "jsonl",
+                     prefetch: int = 4) -> AsyncIterator[bytes]:
+    sink = ZipChunkWriter()
+    errors = []
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        manifest = zipfile.ZipInfo(f"metadata.{manifest_format}")
+        manifest.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(manifest, "w", force_zip64=True) as dest:
+            header: Optional[List[str]] = None
+            async for doc in await open_cursor():
+                record = FolkloreCollection.model_validate(doc).model_dump(mode="json", by_alias=True)
+                if manifest_format == "csv":
+                    row = flatten(record)
+                    line = io.StringIO()
+                    if header is None:
+                        header = list(row)
+                        csv.writer(line).writerow(header)
+                    csv.DictWriter(line, fieldnames=header, extrasaction="ignore").writerow(row)
+                    dest.write(line.getvalue().encode())
+                else:
+                    dest.write(json.dumps(record).encode() + b"\n")
+                if data := sink.drain():
+                    yield data
+
+        # Closed explicitly, a disconnect cancels this generator without finalizing the inner one
+        objects = prefetch_objects(s3, await open_cursor(), prefetch)
+        try:
+            async for doc, result in objects:
+                if isinstance(result, ClientError):
+                    errors.append({"_id": str(doc["_id"]), "filename": doc["filename"], "error": result.response["Error"]["Code"]})
+                    continue
+                info = zipfile.ZipInfo(f"pdfs/{doc['filename']}", date_time=result["LastModified"].timetuple()[:6])
+                chunks = result["Body"].iter_chunks(CHUNK_SIZE)
+                with archive.open(info, "w", force_zip64=True) as dest:
+                    while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+                        dest.write(chunk)
+                        if data := sink.drain():
+                            yield data
+        finally:
+            await objects.aclose()
+
+        if errors:
+            archive.writestr("errors.jsonl", "".join(json.dumps(e) + "\n" for e in errors))
+    yield sink.drain()
@@ -0,0 +1,76 @@
+import time
+from typing import Any, List
+
+from .change_feed import ChangeFeed
+
+# Returns every value stored at a dotted path, flattening arrays the way distinct() does
+def field_values(doc: Any, path: str) -> List[Any]:
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                value = [v for v in value if isinstance(v, dict)]
+                next_values.extend(v[part] for v in value if part in v)
+            elif isinstance(value, dict) and part in value:
+                next_values.append(value[part])
+        values = next_values
+    flat = []
+    for value in values:
+        flat.extend(value if isinstance(value, list) else [value])
+    return flat
+
+# In-memory cache of distinct() results per field path. Entries are patched on inserts
+# and dropped on updates/deletes seen by the change feed; when no change stream is
+# running they expire after ttl seconds instead.
+class FacetCache:
+    def __init__(self, collection, feed: ChangeFeed, ttl: float = 300):
+        self.collection = collection
+        self.feed = feed
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._values: dict[str, tuple[float, List[Any]]] = {}
+        self._generation = 0
+        feed.subscribe(self.on_change)
+
+    async def distinct(self, path: str) -> List[Any]:
+        entry = self._values.get(path)
+        if entry and (self.feed.active or time.monotonic() - entry[0] < self.ttl):
+            self.hits += 1
+            return list(entry[1])
+        self.misses += 1
+        generation = self._generation
+        values = await self.collection.distinct(path)
+        # Skip storing if a change arrived while the query was in flight
+        if generation == self._generation:
+            self._values[path] = (time.monotonic(), values)
+        return list(values)
+
+    def on_change(self, change: dict):
+        operation = change["operationType"]
+        # Loads in flight may have missed this change, inserts included
+        self._generation += 1
+        if operation == "insert":
+            for path, (_, values) in self._values.items():
+                for value in field_values(change["fullDocument"], path):
+                    if value not in values:
+                        values.append(value)
+            return
+        if operation == "update":
+            description = change["updateDescription"]
+            changed = list(description.get("updatedFields", {})) + list(description.get("removedFields", []))
+            for path in list(self._values):
+                if any(path == key or path.startswith(key + ".") or key.startswith(path + ".") for key in changed):
+                    del self._values[path]
+            return
+        # Deletes, replaces and invalidations can remove values, rebuild on next use
+        self._values.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._values),
+            "change_stream_active": self.feed.active,
+        }
@@ -0,0 +1,214 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+from botocore.exceptions import ClientError
+from fastapi import Request, HTTPException, status
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from .downloads import BUCKET, CHUNK_SIZE, raise_for_s3_error
+
+class CachedFile:
+    def __init__(self, key: str, etag: str, size: int, content_type: str, path: str):
+        self.key = key
+        self.etag = etag
+        self.size = size
+        self.content_type = content_type
+        self.path = path
+        self.checked_at = time.monotonic()
+
+    def metadata(self) -> dict:
+        return {"key": self.key, "etag": self.etag, "size": self.size, "content_type": self.content_type}
+
+# Hands the open file to the server when it supports the ASGI zero-copy extension,
+# otherwise behaves like FileResponse (which also serves Range requests). uvicorn, which
+# the Dockerfile runs, doesn't offer the extension, so there hits are chunked reads.
+# on_close runs once the response is sent or aborted.
+class SendfileResponse(FileResponse):
+    def __init__(self, *args, on_close=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            extensions = scope.get("extensions") or {}
+            headers = dict(scope["headers"])
+            if "http.response.zerocopysend" not in extensions or b"range" in headers or scope["method"] == "HEAD":
+                return await super().__call__(scope, receive, send)
+            self.set_stat_headers(await anyio.to_thread.run_sync(os.stat, self.path))
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(), "more_body": False})
+        finally:
+            if self.on_close:
+                self.on_close()
+
+# Locks the first free slot-N subdirectory for this process. The lock lives as long as the
+# process, so each worker owns its index, budget and temp files, and a restarted worker
+# picks up a slot (and the files) a previous one left behind.
+def claim_slot(directory: str):
+    for n in range(1024):
+        slot = os.path.join(directory, f"slot-{n}")
+        os.makedirs(slot, exist_ok=True)
+        lock = open(os.path.join(slot, ".lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            continue
+        return slot, lock
+    raise RuntimeError(f"No free file cache slot in {directory}")
+
+# Size-bounded LRU of S3 objects on local disk. Files are written to a temp name and
+# renamed into place, concurrent misses for one key share a single S3 fetch, and
+# entries are revalidated against the S3 ETag every revalidate_after seconds.
+# Workers sharing the directory each use their own slot, max_bytes is per worker.
+class DiskCache:
+    def __init__(self, s3, directory: str, max_bytes: int, revalidate_after: float = 300):
+        self.s3 = s3
+        self.directory, self._slot_lock = claim_slot(directory)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries: OrderedDict[str, CachedFile] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._too_large: set[str] = set()
+        # Keys with responses in flight, eviction skips them until they are sent
+        self._pins: dict[str, int] = {}
+        self._load_index()
+
+    def _name(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    # Rebuilds the index from metadata files left by a previous run, oldest access first
+    def _load_index(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.unlink(path)
+            elif name.endswith(".json") and os.path.exists(path[:-5]):
+                with open(path) as f:
+                    meta = json.load(f)
+                found.append((os.stat(path[:-5]).st_atime, CachedFile(path=path[:-5], **meta)))
+        for _, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[entry.key] = entry
+            self.total_bytes += entry.size
+
+    async def response(self, request: Request, key: str) -> Optional[Response]:
+        entry = await self.get(key)
+        if entry is None:
+            return None
+        if request.headers.get("if-none-match") == entry.etag:
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": entry.etag})
+        # Another request's fill may have evicted it while this one waited, or the file is
+        # gone from disk; either way the caller streams from S3 instead
+        if self._entries.get(key) is not entry:
+            return None
+        if not os.path.exists(entry.path):
+            self._remove(self._entries.pop(key))
+            return None
+        self._pins[key] = self._pins.get(key, 0) + 1
+        return SendfileResponse(
+            entry.path, media_type=entry.content_type, headers={"ETag": entry.etag}, on_close=lambda: self._unpin(key)
+        )
+
+    def _unpin(self, key: str):
+        if (pins := self._pins.pop(key) - 1) > 0:
+            self._pins[key] = pins
+        self._evict()
+
+    # Returns None for objects too large to cache, callers then stream from S3
+    async def get(self, key: str) -> Optional[CachedFile]:
+        if key in self._too_large:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.revalidate_after:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.create_task(self._load(key, entry))
+            self._inflight[key].add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(self._inflight[key])
+
+    async def _load(self, key: str, entry: Optional[CachedFile]) -> Optional[CachedFile]:
+        try:
+            if entry is not None:
+                head = await run_in_threadpool(self.s3.head_object, Bucket=BUCKET, Key=key)
+                if head["ETag"] == entry.etag:
+                    self.hits += 1
+                    entry.checked_at = time.monotonic()
+                    self._entries.move_to_end(key)
+                    return entry
+            self.misses += 1
+            filled = await run_in_threadpool(self._fill, key)
+        except ClientError as e:
+            raise_for_s3_error(e)
+        if filled is None:
+            self._too_large.add(key)
+            return None
+        if (previous := self._entries.pop(key, None)) is not None:
+            self.total_bytes -= previous.size
+        self._entries[key] = filled
+        self.total_bytes += filled.size
+        self._evict()
+        return filled
+
+    def _fill(self, key: str) -> Optional[CachedFile]:
+        result = self.s3.get_object(Bucket=BUCKET, Key=key)
+        if result["ContentLength"] > self.max_bytes:
+            result["Body"].close()
+            return None
+        path = self._name(key)
+        entry = CachedFile(key, result["ETag"], result["ContentLength"], result.get("ContentType") or "application/pdf", path)
+        self._write_atomic(path, result["Body"].iter_chunks(CHUNK_SIZE))
+        self._write_atomic(path + ".json", [json.dumps(entry.metadata()).encode()])
+        return entry
+
+    def _write_atomic(self, path: str, chunks):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    # Oldest first, skipping files that are being served
+    def _evict(self):
+        for key in list(self._entries):
+            if self.total_bytes <= self.max_bytes or len(self._entries) <= 1:
+                return
+            if key not in self._pins:
+                self._remove(self._entries.pop(key))
+
+    def _remove(self, entry: CachedFile):
+        self.total_bytes -= entry.size
+        for path in (entry.path, entry.path + ".json"):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from itertools import count
+from typing import List, Optional
+
+from pymongo.errors import PyMongoError
+
+from .change_feed import ChangeFeed
+
+logger = logging.getLogger(__name__)
+
+# geography -> genre -> sub_category_1 -> ..., stopping at the first missing level
+def folder_path_of(archive_index: dict) -> List[str]:
+    path = []
+    for i in count():
+        field = "geography" if i == 0 else "genre" if i == 1 else f"sub_category_{i - 1}"
+        if archive_index.get(field) is None:
+            return path
+        path.append(archive_index[field])
+
+class FolderNode:
+    __slots__ = ("count", "children")
+
+    def __init__(self):
+        self.count = 0
+        self.children: dict[str, FolderNode] = {}
+
+    def to_dict(self, name: str) -> dict:
+        return {
+            "name": name,
+            "count": self.count,
+            "children": [child.to_dict(k) for k, child in sorted(self.children.items())],
+        }
+
+# The whole archive_index hierarchy with per-node item counts, built with one $group and
+# kept in memory. Inserts are applied in place; other changes touching archive_index
+# trigger a background rebuild, as does ttl expiry when change streams are unavailable.
+class FolderTree:
+    def __init__(self, collection, feed: ChangeFeed, ttl: float = 300):
+        self.collection = collection
+        self.feed = feed
+        self.ttl = ttl
+        self.version = 0
+        self._root: Optional[FolderNode] = None
+        self._built_at = 0.0
+        self._rendered: dict[tuple, tuple[bytes, str]] = {}
+        self._building: Optional[asyncio.Task] = None
+        self._dirty = False
+        feed.subscribe(self.on_change)
+
+    def _rebuild_soon(self):
+        if self._building is None or self._building.done():
+            self._building = asyncio.create_task(self._rebuild())
+
+    async def _rebuild(self):
+        while True:
+            self._dirty = False
+            groups = await (await self.collection.aggregate([{"$group": {"_id": "$archive_index", "count": {"$sum": 1}}}])).to_list()
+            root = FolderNode()
+            for group in groups:
+                self._add(root, folder_path_of(group["_id"] or {}), group["count"])
+            self._root = root
+            self._built_at = time.monotonic()
+            self._changed()
+            # Changes seen mid-build may be missing from this snapshot
+            if not self._dirty:
+                return
+
+    @staticmethod
+    def _add(root: FolderNode, path: List[str], n: int):
+        node = root
+        node.count += n
+        for name in path:
+            node = node.children.setdefault(name, FolderNode())
+            node.count += n
+
+    def _changed(self):
+        self.version += 1
+        self._rendered.clear()
+
+    def on_change(self, change: dict):
+        operation = change["operationType"]
+        if self._building is not None and not self._building.done():
+            self._dirty = True
+            return
+        if operation == "insert" and self._root is not None:
+            self._add(self._root, folder_path_of(change["fullDocument"].get("archive_index") or {}), 1)
+            self._changed()
+            return
+        if operation == "update":
+            description = change["updateDescription"]
+            changed = list(description.get("updatedFields", {})) + list(description.get("removedFields", []))
+            if not any(key == "archive_index" or key.startswith("archive_index.") for key in changed):
+                return
+        # Deletes carry no document, so counts can only be recomputed
+        self._rebuild_soon()
+
+    # Waits for the first build, False if the tree can't be built right now
+    async def ready(self) -> bool:
+        if self._root is None:
+            self._rebuild_soon()
+            try:
+                await asyncio.shield(self._building)
+            except PyMongoError:
+                logger.exception("Building the folder tree failed")
+                return False
+        elif not self.feed.active and time.monotonic() - self._built_at > self.ttl:
+            self._rebuild_soon()
+        return self._root is not None
+
+    def node(self, path: List[str]) -> Optional[FolderNode]:
+        node = self._root
+        for name in path:
+            if node is None:
+                return None
+            node = node.children.get(name)
+        return node
+
+    async def children(self, path: List[str]) -> Optional[List[str]]:
+        if not await self.ready():
+            return None
+        node = self.node(path)
+        return sorted(node.children) if node else []
+
+    # Serialized subtree and its strong ETag, memoized until the tree changes
+    def render(self, path: List[str]) -> Optional[tuple[bytes, str]]:
+        key = tuple(path)
+        if key not in self._rendered:
+            node = self.node(path)
+            if node is None:
+                return None
+            body = json.dumps(node.to_dict(path[-1] if path else ""), separators=(",", ":")).encode()
+            self._rendered[key] = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        return self._rendered[key]
+
+    def stats(self) -> dict:
+        return {"built": self._root is not None, "version": self.version, "rendered": len(self._rendered)}
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, List
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from .query_cache import cache_key
+from .random_selection import RANDOM_KEY
+
+logger = logging.getLogger(__name__)
+
+# Indexes backing the Archive access patterns, by name:
+#  - folder browsing matches archive_index.* by prefix (folderContents, /random, /export)
+#  - filter chips use $in on folklore.genre / language_of_origin, /random seeks random_key after them
+#  - ingest upserts by filename
+ARCHIVE_INDEXES = {
+    "archive_index_path": [
+        ("archive_index.geography", ASCENDING),
+        ("archive_index.genre", ASCENDING),
+        ("archive_index.sub_category_1", ASCENDING),
+        ("archive_index.sub_category_2", ASCENDING),
+    ],
+    "archive_geography_random": [("archive_index.geography", ASCENDING), (RANDOM_KEY, ASCENDING)],
+    "archive_geography_genre_random": [
+        ("archive_index.geography", ASCENDING), ("archive_index.genre", ASCENDING), (RANDOM_KEY, ASCENDING)
+    ],
+    "genre_random": [("folklore.genre", ASCENDING), (RANDOM_KEY, ASCENDING)],
+    "genre_language_random": [
+        ("folklore.genre", ASCENDING), ("folklore.language_of_origin", ASCENDING), (RANDOM_KEY, ASCENDING)
+    ],
+    "language_random": [("folklore.language_of_origin", ASCENDING), (RANDOM_KEY, ASCENDING)],
+    "random_key": [(RANDOM_KEY, ASCENDING)],
+    "filename": [("filename", ASCENDING)],
+}
+
+# Creates missing indexes. Ones whose keys drifted from the declaration are only logged unless
+# `rebuild` is set, dropping an index leaves its queries unindexed until the new build finishes.
+# Indexes we don't declare are left alone (Atlas search indexes live elsewhere anyway).
+async def reconcile_indexes(collection, declared: dict[str, List[tuple]], rebuild: bool = False):
+    existing = await collection.index_information()
+    for name, keys in declared.items():
+        if name in existing:
+            current = [tuple(k) for k in existing[name]["key"]]
+            if current == [tuple(k) for k in keys]:
+                continue
+            if not rebuild:
+                logger.warning("Index %s on %s has keys %s, declared %s, not rebuilding", name, collection.name, current, keys)
+                continue
+        # One failure (e.g. the same keys under another name) mustn't stop the rest
+        try:
+            if name in existing:
+                logger.info("Rebuilding index %s on %s, keys changed", name, collection.name)
+                await collection.drop_index(name)
+            await collection.create_index(keys, name=name)
+        except PyMongoError as e:
+            logger.error("Creating index %s on %s failed: %s", name, collection.name, e)
+    for name in existing.keys() - declared.keys() - {"_id_"}:
+        logger.info("Index %s on %s is not declared by the app", name, collection.name)
+
+async def provision_archive(collection, rebuild: bool = False):
+    try:
+        await reconcile_indexes(collection, ARCHIVE_INDEXES, rebuild)
+    except PyMongoError:
+        logger.exception("Index provisioning on %s failed", collection.name)
+
+# Replaces every literal with "?" so pipelines differing only in values share a shape
+def pipeline_shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: pipeline_shape(v) for k, v in value.items()}
+    if isinstance(value, list) and any(isinstance(v, (dict, list)) for v in value):
+        return [pipeline_shape(v) for v in value]
+    return "?"
+
+def find_in_plan(plan: Any, key: str) -> Any:
+    if isinstance(plan, dict):
+        if key in plan:
+            return plan[key]
+        plan = list(plan.values())
+    if isinstance(plan, list):
+        for value in plan:
+            if (found := find_in_plan(value, key)) is not None:
+                return found
+    return None
+
+def has_stage(plan: Any, stage: str) -> bool:
+    if isinstance(plan, dict):
+        return plan.get("stage") == stage or any(has_stage(v, stage) for v in plan.values())
+    if isinstance(plan, list):
+        return any(has_stage(v, stage) for v in plan)
+    return False
+
+# Diagnostics mode: explains each distinct pipeline shape once, in the background, and
+# reports plans that scan the whole collection or examine far more documents than they return
+class PlanInspector:
+    def __init__(self, database, collection_name: str = "Archive", ratio_threshold: float = 100, max_findings: int = 100):
+        self.database = database
+        self.collection_name = collection_name
+        self.ratio_threshold = ratio_threshold
+        self.findings = deque(maxlen=max_findings)
+        self._seen: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def observe(self, pipeline: List[dict]):
+        # $search runs in mongot, its plan says nothing about our indexes
+        if any("$search" in stage for stage in pipeline):
+            return
+        shape = cache_key(pipeline_shape(pipeline))
+        if shape in self._seen:
+            return
+        self._seen.add(shape)
+        task = asyncio.create_task(self._explain(pipeline, shape))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, pipeline: List[dict], shape: str):
+        try:
+            plan = await self.database.command({
+                "explain": {"aggregate": self.collection_name, "pipeline": pipeline, "cursor": {}},
+                "verbosity": "executionStats",
+            })
+        except PyMongoError as e:
+            logger.warning("Explain failed for %s: %s", shape, e)
+            return
+        stats = find_in_plan(plan, "executionStats") or {}
+        examined = stats.get("totalDocsExamined", 0)
+        returned = stats.get("nReturned", 0)
+        collscan = has_stage(plan, "COLLSCAN")
+        ratio = examined / max(returned, 1)
+        if collscan or ratio > self.ratio_threshold:
+            pipeline = json.loads(json.dumps(pipeline, default=str))
+            finding = {"shape": shape, "pipeline": pipeline, "collscan": collscan, "docs_examined": examined, "returned": returned}
+            logger.warning("Inefficient plan (collscan=%s, examined=%d, returned=%d): %s", collscan, examined, returned, shape)
+            self.findings.append(finding)
@@ -0,0 +1,163 @@
+"""Bulk loader for new FolkloreCollection records and their PDFs.
+
+    python -m app.ingest records.jsonl --pdf-dir ./pdfs
+
+Records are validated against the models, upserted by filename with unordered bulk
+writes, and their PDFs uploaded to S3 with concurrent multipart transfers. Point
+--mongo-uri/--db and --s3-endpoint-url at local stand-ins (mongod, moto_server,
+MinIO) to run it without touching Atlas or AWS.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from bson import ObjectId
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from pymongo import AsyncMongoClient, InsertOne, UpdateOne
+
+from .downloads import BUCKET
+from .models import FolkloreCollection
+from .random_selection import RANDOM_KEY
+from .thesaurus import ThesaurusMaps
+
+# Fields whose values must have a Thesaurus entry for /filters and filter expansion
+THESAURUS_FIELDS = {"genre": "folklore.genre", "language_of_origin": "folklore.language_of_origin"}
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.docs = 0
+        self.invalid = 0
+        self.missing_files = 0
+        self.files = 0
+        self.bytes = 0
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "docs": self.docs,
+            "invalid": self.invalid,
+            "missing_files": self.missing_files,
+            "files": self.files,
+            "megabytes": self.bytes / 1024 ** 2,
+            "seconds": elapsed,
+            "docs_per_sec": self.docs / elapsed if elapsed else 0.0,
+            "mb_per_sec": self.bytes / 1024 ** 2 / elapsed if elapsed else 0.0,
+        }
+
+def read_batches(path: str, batch_size: int, stats: IngestStats) -> Iterator[List[dict]]:
+    batch = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                FolkloreCollection.model_validate(record)
+            except ValidationError as e:
+                stats.invalid += 1
+                print(f"line {line_number}: skipped, {e.error_count()} validation errors")
+                continue
+            # The raw record is stored, it carries fields the API model omits (archive_index)
+            if "_id" in record:
+                record["_id"] = ObjectId(record["_id"])
+            batch.append(record)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def write_request(record: dict):
+    if not record.get("filename"):
+        return InsertOne({**record, RANDOM_KEY: random.random()})
+    fields = {k: v for k, v in record.items() if k != "_id"}
+    on_insert = {RANDOM_KEY: random.random()}
+    # A supplied _id is kept for new records, an existing record keeps its own (_id is immutable)
+    if "_id" in record:
+        on_insert["_id"] = record["_id"]
+    return UpdateOne({"filename": record["filename"]}, {"$set": fields, "$setOnInsert": on_insert}, upsert=True)
+
+# Adds identity Thesaurus entries for values it doesn't map yet, once per batch
+async def register_thesaurus_values(database, thesaurus: ThesaurusMaps, batch: List[dict]):
+    requests = []
+    for field, path in THESAURUS_FIELDS.items():
+        known = thesaurus.mapfrom_mapto.setdefault(field, {})
+        for record in batch:
+            value = record
+            for part in path.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is None or value in known:
+                continue
+            known[value] = value
+            # $addToSet also covers an entry whose maps_to isn't listed in its own maps_from
+            requests.append(UpdateOne({"type": field, "maps_to": value}, {"$addToSet": {"maps_from": value}}, upsert=True))
+    if requests:
+        await database["Thesaurus"].bulk_write(requests, ordered=False)
+
+def upload_pdf(s3, path: str, key: str, config: TransferConfig) -> int:
+    s3.upload_file(path, BUCKET, key, ExtraArgs={"ContentType": "application/pdf"}, Config=config)
+    return os.path.getsize(path)
+
+async def ingest(records_path: str, pdf_dir: str, database, s3, batch_size: int, upload_workers: int,
+                 multipart_threshold: int) -> IngestStats:
+    stats = IngestStats()
+    loop = asyncio.get_running_loop()
+    config = TransferConfig(multipart_threshold=multipart_threshold, max_concurrency=4)
+    thesaurus = ThesaurusMaps(await database["Thesaurus"].find().to_list(), version=0)
+    with ThreadPoolExecutor(max_workers=upload_workers) as executor:
+        for batch in read_batches(records_path, batch_size, stats):
+            uploads = []
+            for record in batch:
+                if not pdf_dir or not record.get("filename"):
+                    continue
+                path = os.path.join(pdf_dir, record["filename"])
+                if not os.path.exists(path):
+                    stats.missing_files += 1
+                    continue
+                uploads.append(loop.run_in_executor(executor, upload_pdf, s3, path, record["filename"], config))
+            # Files land before their records so the API never lists an entry it can't download
+            for size in await asyncio.gather(*uploads):
+                stats.files += 1
+                stats.bytes += size
+            # Thesaurus first, the API sees new facet values as soon as the records land
+            await register_thesaurus_values(database, thesaurus, batch)
+            await database["Archive"].bulk_write([write_request(record) for record in batch], ordered=False)
+            stats.docs += len(batch)
+            report = stats.report()
+            print(f"{stats.docs} docs, {report['docs_per_sec']:.1f} docs/s, {report['mb_per_sec']:.2f} MB/s")
+    return stats
+
+async def main(args):
+    load_dotenv()
+    client = AsyncMongoClient(args.mongo_uri or os.environ["ATLAS_URI"])
+    s3 = boto3.client("s3", endpoint_url=args.s3_endpoint_url)
+    try:
+        stats = await ingest(
+            args.records, args.pdf_dir, client[args.db or os.environ["DB_NAME"]], s3,
+            batch_size=args.batch_size, upload_workers=args.upload_workers,
+            multipart_threshold=args.multipart_threshold_mb * 1024 ** 2,
+        )
+    finally:
+        await client.close()
+    print(json.dumps(stats.report()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("records", help="JSONL file with one FolkloreCollection record per line")
+    parser.add_argument("--pdf-dir", default=None, help="directory holding the files named by each record's filename")
+    parser.add_argument("--mongo-uri", default=None, help="defaults to ATLAS_URI")
+    parser.add_argument("--db", default=None, help="defaults to DB_NAME")
+    parser.add_argument("--s3-endpoint-url", default=None, help="e.g. http://localhost:5000 for moto_server")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--upload-workers", type=int, default=8)
+    parser.add_argument("--multipart-threshold-mb", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
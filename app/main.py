@@ -3,33 +3,119 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from cacheout import Cache
-from pymongo import MongoClient
-from .routes import router as folklore_router
+from pymongo import AsyncMongoClient
+from .routes import router as folklore_router, collect_cache_stats
 from .auth_routes import router as auth_router
 from .auth import OidcClient
+from .oidc_auth import AUDIENCE, ISSUER, JWKS_URL, JwksCache
+from .change_feed import ChangeFeed
+from .downloads import DownloadSettings
+from .facets import FacetCache
+from .file_cache import DiskCache
+from .folder_tree import FolderTree
+from .query_cache import QueryCache
+from .indexes import PlanInspector, provision_archive
+from .metrics import Metrics, MetricsMiddleware, MongoCommandMetrics, cache_metrics, idp_event_hooks, instrument_s3
+from .metrics import router as metrics_router
+from .random_selection import backfill_random_keys
+from .sessions import create_session_store
+from .thesaurus import Thesaurus
 import boto3
+import httpx
 from dotenv import load_dotenv
+import asyncio
 import os
 
+# Indexes first, the random key backfill relies on them
+async def setup_archive(collection):
+    if os.environ.get("MONGO_MANAGE_INDEXES", "true") == "true":
+        await provision_archive(collection, rebuild=os.environ.get("MONGO_REBUILD_INDEXES", "false") == "true")
+    await backfill_random_keys(collection)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     load_dotenv()
-    app.mongodb_client = MongoClient(os.environ["ATLAS_URI"])
+    # Pool sizes are per worker process, tune alongside the uvicorn worker count
+    app.mongodb_client = AsyncMongoClient(
+        os.environ["ATLAS_URI"],
+        maxPoolSize=int(os.environ.get("MONGO_MAX_POOL_SIZE", 100)),
+        minPoolSize=int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+        maxConnecting=int(os.environ.get("MONGO_MAX_CONNECTING", 2)),
+        waitQueueTimeoutMS=int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000)),
+        event_listeners=[MongoCommandMetrics(app.state.metrics)],
+    )
     app.database = app.mongodb_client[os.environ["DB_NAME"]]
     app.auth = OidcClient(
         client_id=os.environ["OIDC_CLIENT_ID"],
         client_secret=os.environ["OIDC_CLIENT_SECRET"],
         authority_url=os.environ["OIDC_AUTHORITY_URL"],
         redirect_url=os.environ["OIDC_REDIRECT_URL"],
-        frontend_url=os.environ["FRONTEND_URL"]
+        frontend_url=os.environ["FRONTEND_URL"],
+        issuer=os.environ.get("OIDC_ISSUER", ISSUER),
+        audience=os.environ.get("OIDC_AUDIENCE", AUDIENCE),
+    )
+    app.state.session_store = create_session_store(
+        os.environ.get("SESSION_BACKEND", "memory"),
+        app.database,
+        ttl=15 * 60,
+        refresh_interval=float(os.environ.get("SESSION_REFRESH_INTERVAL", 60)),
+        sqlite_path=os.environ.get("SESSION_SQLITE_PATH", "sessions.db"),
     )
-    app.state.session_store = Cache(maxsize=4096, ttl=15 * 60, default=None)
-    app.state.jwkts_store = Cache(maxsize=1, ttl=24*60*60, default=None)
+    await app.state.session_store.setup()
+    app.state.http_client = httpx.AsyncClient(timeout=10, event_hooks=idp_event_hooks(app.state.metrics))
+    app.state.jwks = JwksCache(app.state.http_client, url=os.environ.get("OIDC_JWKS_URL", JWKS_URL))
+    app.state.verified_tokens = Cache(maxsize=4096, ttl=0, default=None)
+
+    app.state.archive_feed = ChangeFeed(app.database["Archive"])
+    app.state.facets = FacetCache(
+        app.database["Archive"], app.state.archive_feed, ttl=float(os.environ.get("FACET_CACHE_TTL", 300))
+    )
+    app.state.query_cache = QueryCache(
+        app.state.archive_feed,
+        maxsize=int(os.environ.get("QUERY_CACHE_SIZE", 1024)),
+        ttl=float(os.environ.get("QUERY_CACHE_TTL", 60)),
+        max_bytes=int(os.environ.get("QUERY_CACHE_MAX_BYTES", 64 * 1024 ** 2)),
+    )
+    app.state.folder_tree = FolderTree(
+        app.database["Archive"], app.state.archive_feed, ttl=float(os.environ.get("FOLDER_TREE_TTL", 300))
+    )
+    app.state.thesaurus_feed = ChangeFeed(app.database["Thesaurus"])
+    app.state.thesaurus = Thesaurus(
+        app.database["Thesaurus"], app.state.thesaurus_feed, ttl=float(os.environ.get("THESAURUS_TTL", 300))
+    )
+    app.state.archive_feed.start()
+    app.state.thesaurus_feed.start()
+    # Skip per-request pydantic validation of list bodies, ingest validates records instead
+    app.state.fast_responses = os.environ.get("FAST_RESPONSES", "false") == "true"
+    app.state.plans = PlanInspector(app.database) if os.environ.get("QUERY_DIAGNOSTICS") == "true" else None
+    app.state.archive_setup = asyncio.create_task(setup_archive(app.database["Archive"]))
 
     app.s3 = boto3.client("s3")
+    instrument_s3(app.s3, app.state.metrics)
+    app.downloads = DownloadSettings(
+        redirect=os.environ.get("DOWNLOAD_MODE", "stream") == "redirect",
+        presign_ttl=int(os.environ.get("DOWNLOAD_PRESIGN_TTL", 300)),
+        export_prefetch=int(os.environ.get("EXPORT_PREFETCH", 4)),
+    )
+    app.file_cache = None
+    if cache_dir := os.environ.get("FILE_CACHE_DIR"):
+        app.file_cache = DiskCache(
+            app.s3,
+            cache_dir,
+            max_bytes=int(os.environ.get("FILE_CACHE_MAX_BYTES", 2 * 1024 ** 3)),
+            revalidate_after=float(os.environ.get("FILE_CACHE_REVALIDATE", 300)),
+        )
+    if slow_request_ms := os.environ.get("SLOW_REQUEST_MS"):
+        app.state.metrics.slow_request_seconds = float(slow_request_ms) / 1000
+    app.state.metrics.collectors.append(lambda: cache_metrics(collect_cache_stats(app)))
     yield
-    app.mongodb_client.close()
+    await app.state.archive_feed.stop()
+    await app.state.thesaurus_feed.stop()
+    await app.state.http_client.aclose()
+    await app.state.session_store.close()
+    await app.mongodb_client.close()
 app = FastAPI(lifespan=lifespan)
+app.state.metrics = Metrics()
 origins = [
     "https://docker15547-env-7928981.us.reclaim.cloud",
     "https://env-7928981.us.reclaim.cloud",
@@ -42,6 +128,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges"],
 )
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware, metrics=app.state.metrics)
 app.include_router(folklore_router, tags=["folklore"], prefix="/folklore")
 app.include_router(auth_router, tags=["auth"], prefix="/auth")
+app.include_router(metrics_router)
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, List, Optional
+
+import httpx
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from pymongo import monitoring
+
+from .indexes import pipeline_shape
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Distinct query shapes get their own label value up to this many, the rest share "other"
+MAX_SHAPES = 500
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Mongo commands issued while serving the current request, only collected when the slow log is on
+request_commands: ContextVar[Optional[List[dict]]] = ContextVar("request_commands", default=None)
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+# Cumulative-bucket histogram in the Prometheus text format. Observations are a bisect and
+# two increments under a lock, botocore events fire from threadpool threads.
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One counter per bucket plus +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in snapshot:
+            base = format_labels(self.labelnames, labels)
+            sep = "," if base else ""
+            total = 0
+            for bound, n in zip(self.buckets, series):
+                total += n
+                yield f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {total}'
+            total += series[len(self.buckets)]
+            yield f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {total}'
+            yield f"{self.name}_sum{{{base}}} {series[-1]}"
+            yield f"{self.name}_count{{{base}}} {total}"
+
+class Metrics:
+    def __init__(self):
+        self.http = Histogram("archive_http_request_duration_seconds", "Request latency by route template.",
+                              ("method", "route", "status"))
+        self.mongo = Histogram("archive_mongo_command_duration_seconds", "Mongo command latency by query shape.",
+                               ("command", "collection", "shape", "outcome"))
+        self.s3 = Histogram("archive_s3_call_duration_seconds", "S3 call latency up to the response headers.",
+                            ("operation", "status"))
+        self.idp = Histogram("archive_idp_request_duration_seconds", "OIDC provider and JWKS request latency.",
+                             ("path", "status"))
+        self.shapes: dict[str, str] = {}
+        # Called at scrape time, each yields lines for gauges computed from live state
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+        self.slow_request_seconds: Optional[float] = None
+
+    # Short stable id of a query's structure with literal values stripped
+    def shape_id(self, query) -> str:
+        shape = json.dumps(pipeline_shape(query), sort_keys=True)
+        shape_id = hashlib.blake2b(shape.encode(), digest_size=4).hexdigest()
+        if shape_id not in self.shapes:
+            if len(self.shapes) >= MAX_SHAPES:
+                return "other"
+            self.shapes[shape_id] = shape
+        return shape_id
+
+    def render(self) -> str:
+        lines = []
+        for histogram in (self.http, self.mongo, self.s3, self.idp):
+            lines.extend(histogram.render())
+        lines.append("# HELP archive_mongo_shape_info Query structure behind each shape label.")
+        lines.append("# TYPE archive_mongo_shape_info gauge")
+        for shape_id, shape in list(self.shapes.items()):
+            lines.append(f'archive_mongo_shape_info{{{format_labels(("shape", "query"), (shape_id, shape))}}} 1')
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+# Times every request by its route template (not the raw path, which would explode label
+# cardinality) and logs requests slower than SLOW_REQUEST_MS with the Mongo commands they ran.
+class MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status_code = 500
+        token = request_commands.set([] if self.metrics.slow_request_seconds is not None else None)
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            commands = request_commands.get()
+            request_commands.reset(token)
+            route = scope.get("route")
+            self.metrics.http.observe(elapsed, scope["method"], route.path if route else "unmatched", str(status_code))
+            if commands is not None and elapsed >= self.metrics.slow_request_seconds:
+                query = scope.get("query_string", b"").decode()
+                logger.warning(
+                    "Slow request %s %s%s took %.0f ms, status %d, mongo commands: %s",
+                    scope["method"], scope["path"], f"?{query}" if query else "", elapsed * 1000, status_code,
+                    json.dumps(commands, default=str),
+                )
+
+# The query part of each command whose shape is worth telling apart
+QUERY_FIELDS = {"aggregate": "pipeline", "find": "filter", "count": "query", "distinct": "query", "delete": "deletes", "update": "updates"}
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self._pending: dict[tuple, tuple] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        field = QUERY_FIELDS.get(event.command_name)
+        query = command.get(field) if field else None
+        entry = None
+        if (commands := request_commands.get()) is not None:
+            entry = {"command": event.command_name, "collection": collection}
+            if query is not None:
+                entry[field] = query
+            commands.append(entry)
+        shape = self.metrics.shape_id(query) if query is not None else ""
+        self._pending[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else "", shape, entry
+        )
+
+    def _finish(self, event, outcome: str):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, shape, entry = pending
+        seconds = event.duration_micros / 1e6
+        self.metrics.mongo.observe(seconds, event.command_name, collection, shape, outcome)
+        if entry is not None:
+            entry["ms"] = seconds * 1000
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, "error")
+
+# Times each S3 API call from botocore's before-call to after-call (or after-call-error)
+def instrument_s3(s3, metrics: Metrics):
+    def before_call(model, context, **kwargs):
+        context["metrics_start"] = time.perf_counter()
+        context["metrics_operation"] = model.name
+
+    def after_call(http_response, context, **kwargs):
+        if "metrics_start" in context:
+            metrics.s3.observe(time.perf_counter() - context["metrics_start"], context["metrics_operation"], str(http_response.status_code))
+
+    def after_call_error(context, **kwargs):
+        if "metrics_start" in context:
+            metrics.s3.observe(time.perf_counter() - context["metrics_start"], context["metrics_operation"], "error")
+
+    s3.meta.events.register("before-call.s3", before_call)
+    s3.meta.events.register("after-call.s3", after_call)
+    s3.meta.events.register("after-call-error.s3", after_call_error)
+
+# httpx event hooks for the shared client used for the OIDC provider and JWKS
+def idp_event_hooks(metrics: Metrics) -> dict:
+    async def on_request(request: httpx.Request):
+        request.extensions["metrics_start"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response):
+        start = response.request.extensions.get("metrics_start")
+        if start is not None:
+            metrics.idp.observe(time.perf_counter() - start, response.request.url.path, str(response.status_code))
+
+    return {"request": [on_request], "response": [on_response]}
+
+# Request counts and hit ratios from the caches' stats(), as exposed on /folklore/cacheStats
+def cache_metrics(stats: dict[str, dict]) -> Iterable[str]:
+    yield "# HELP archive_cache_requests_total Cache lookups by result."
+    yield "# TYPE archive_cache_requests_total counter"
+    for cache, values in stats.items():
+        if "hits" in values and "misses" in values:
+            yield f'archive_cache_requests_total{{cache="{cache}",result="hit"}} {values["hits"]}'
+            yield f'archive_cache_requests_total{{cache="{cache}",result="miss"}} {values["misses"]}'
+            if "coalesced" in values:
+                yield f'archive_cache_requests_total{{cache="{cache}",result="coalesced"}} {values["coalesced"]}'
+    yield "# HELP archive_cache_hit_ratio Hits over hits plus misses since startup."
+    yield "# TYPE archive_cache_hit_ratio gauge"
+    for cache, values in stats.items():
+        if "hits" in values and "misses" in values:
+            lookups = values["hits"] + values["misses"]
+            yield f'archive_cache_hit_ratio{{cache="{cache}"}} {values["hits"] / lookups if lookups else 0.0}'
+    yield "# HELP archive_cache_entries Entries currently held."
+    yield "# TYPE archive_cache_entries gauge"
+    for cache, values in stats.items():
+        if "entries" in values:
+            yield f'archive_cache_entries{{cache="{cache}"}} {values["entries"]}'
+
+router = APIRouter()
+
+# Unauthenticated for the scraper, keep it off the public ingress
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    return PlainTextResponse(request.app.state.metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
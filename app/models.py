@@ -93,3 +93,39 @@ class FolkloreCollection(BaseModel):
                     analysis=self.analysis, storage_medium=self.storage_medium,
                     cleaned_full_text=self.cleaned_full_text,
                     date_collected=self.date_collected, location_collected=self.location_collected)
+
+# Lightweight shapes for list views that only need a handful of fields
+class FolkloreSummaryItem(BaseModel):
+    item: str
+    genre: str
+    language_of_origin: Optional[str]
+    medium: str
+    place_mentioned: List[Location]
+
+class FolkloreSummary(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    filename: Optional[str]
+    folklore: FolkloreSummaryItem
+    date_collected: str
+    location_collected: Location
+
+# Mongo projection matching FolkloreCollection, leaves out archive_index and other internal fields
+FULL_PROJECTION = {field.alias or name: 1 for name, field in FolkloreCollection.model_fields.items()}
+
+# Mongo projection matching FolkloreSummary
+SUMMARY_PROJECTION = {
+    "filename": 1,
+    "folklore.item": 1,
+    "folklore.genre": 1,
+    "folklore.language_of_origin": 1,
+    "folklore.medium": 1,
+    "folklore.place_mentioned": 1,
+    "date_collected": 1,
+    "location_collected": 1,
+}
+
+# One page of results together with the total and per-field facet counts for the same filter
+class FolkloreSearchPage(BaseModel):
+    results: List[FolkloreCollection]
+    total: int
+    facets: dict[str, dict[str, int]]
@@ -1,7 +1,80 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
 from fastapi import Request, HTTPException, status
 from jose import jwt, JWTError
 import httpx
 
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable with OIDC_JWKS_URL, OIDC_ISSUER and OIDC_AUDIENCE
+JWKS_URL = "https://auth-test.berkeley.edu/cas/oidc/jwks"
+ISSUER = "https://auth-test.berkeley.edu/cas/oidc"
+AUDIENCE = "anthropology_folklore_archive"
+
+# Signing keys of the IdP indexed by kid. Keys are refreshed in the background once
+# they are refresh_after seconds old, and fetched immediately when a token names a kid
+# we haven't seen (key rotation). Both start at most once per min_refresh_interval, so
+# a failing IdP isn't called on every request.
+class JwksCache:
+    def __init__(self, client: httpx.AsyncClient, url: str = JWKS_URL, refresh_after: float = 60 * 60,
+                 max_age: float = 24 * 60 * 60, min_refresh_interval: float = 60):
+        self.client = client
+        self.url = url
+        self.refresh_after = refresh_after
+        self.max_age = max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: dict[Optional[str], dict] = {}
+        self.fetched_at = 0.0
+        self.attempted_at = float("-inf")
+        self.fetches = 0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    async def get_key(self, kid: Optional[str]) -> dict:
+        now = time.monotonic()
+        age = now - self.fetched_at
+        recently_attempted = now - self.attempted_at < self.min_refresh_interval
+        key = self._lookup(kid)
+        if key is not None and age < self.max_age:
+            if age > self.refresh_after and not recently_attempted:
+                self._start_refresh()
+            return key
+        if key is None and self.keys and recently_attempted:
+            raise JWTError(f"Unknown signing key {kid}")
+        await asyncio.shield(self._start_refresh())
+        if (key := self._lookup(kid)) is None:
+            raise JWTError(f"Unknown signing key {kid}")
+        return key
+
+    def _lookup(self, kid: Optional[str]) -> Optional[dict]:
+        if kid is None and len(self.keys) == 1:
+            return next(iter(self.keys.values()))
+        return self.keys.get(kid)
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refreshing is None or self._refreshing.done():
+            self.attempted_at = time.monotonic()
+            self._refreshing = asyncio.create_task(self._fetch())
+            self._refreshing.add_done_callback(self._log_failure)
+        return self._refreshing
+
+    async def _fetch(self):
+        self.fetches += 1
+        jwks_response = await self.client.get(self.url)
+        jwks_response.raise_for_status()
+        self.keys = {key.get("kid"): key for key in jwks_response.json().get("keys", [])}
+        self.fetched_at = time.monotonic()
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("JWKS refresh failed: %s", task.exception())
+
+    def stats(self) -> dict:
+        return {"fetches": self.fetches, "keys": len(self.keys), "age": time.monotonic() - self.fetched_at}
+
 async def oidc_auth(request: Request):
     # Instead of an Authorization header, retrieve the session_id from cookies.
     session_id = request.cookies.get("session_id")
@@ -11,14 +84,14 @@ async def oidc_auth(request: Request):
             detail="Session cookie missing"
         )
 
-    session = request.app.state.session_store.get(session_id)
-    # Set in order to reset the TTL on use, creating an inactivity timeout
-    request.app.state.session_store.set(session_id, session)
+    session = await request.app.state.session_store.get(session_id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired session"
         )
+    # Reset the TTL on use, creating an inactivity timeout
+    await request.app.state.session_store.touch(session_id, session)
 
     # Retrieve the long token from the session.
     token = session.get("id_token")
@@ -28,29 +101,28 @@ async def oidc_auth(request: Request):
             detail="Session does not contain token"
         )
 
+    # Claims already verified for this session stay valid until the token expires
+    verified_key = (session_id, token)
+    if (claims := request.app.state.verified_tokens.get(verified_key)) is not None:
+        request.state.user = claims
+        return
+
     try:
-        if request.app.state.jwkts_store.get("jwks"):
-            jwks = request.app.state.jwkts_store.get("jwks")
-        else:
-            jwks_url = "https://auth-test.berkeley.edu/cas/oidc/jwks"
-            async with httpx.AsyncClient() as client:
-                jwks_response = await client.get(jwks_url)
-                jwks_response.raise_for_status()
-                jwks = jwks_response.json()
-
-        issuer = "https://auth-test.berkeley.edu/cas/oidc"
-        audience = "anthropology_folklore_archive"
+        kid = jwt.get_unverified_header(token).get("kid")
+        jwk = await request.app.state.jwks.get_key(kid)
 
         decoded = jwt.decode(
             token,
-            jwks,
+            jwk,
             algorithms=["RS256"],
-            audience=audience,
-            issuer=issuer,
+            audience=request.app.auth.audience,
+            issuer=request.app.auth.issuer,
             subject=session.get("uid"),
             access_token=session.get("access_token"),
         )
         request.state.user = decoded
+        if "exp" in decoded and (ttl := decoded["exp"] - time.time()) > 0:
+            request.app.state.verified_tokens.set(verified_key, decoded, ttl=ttl)
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,4 +132,4 @@ async def oidc_auth(request: Request):
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"JWKS fetch error: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Hashable
+
+import orjson
+from cacheout import LRUCache
+
+from .change_feed import ChangeFeed
+
+_MISSING = object()
+
+# Stable key for a compiled query, dict order and ObjectIds don't matter
+def cache_key(*parts: Any) -> str:
+    return json.dumps(parts, sort_keys=True, default=str)
+
+# Serialized size, a proxy for the memory a cached result holds
+def estimate_size(value: Any) -> int:
+    return len(orjson.dumps(value, default=str))
+
+# Bounded LRU/TTL caches for compiled filters and for query results (pages, counts).
+# Results are capped by entry count and by estimated bytes, a full-view list of 500
+# documents weighs megabytes. Concurrent misses for the same key share one Mongo round
+# trip, and any change to the Archive collection drops every cached result.
+class QueryCache:
+    def __init__(self, feed: ChangeFeed, maxsize: int = 1024, ttl: float = 60, max_bytes: int = 64 * 1024 ** 2):
+        self.compiled = LRUCache(maxsize=maxsize, ttl=0)
+        self.results = LRUCache(maxsize=maxsize, ttl=ttl, on_delete=self._on_delete)
+        self.max_bytes = max_bytes
+        self.results_bytes = 0
+        self._sizes: dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+        feed.subscribe(self.on_change)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.results.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+        self.misses += 1
+        generation = self._generation
+        task = asyncio.ensure_future(loader())
+        self._inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+        # Don't cache a result that may predate a change seen while it was loading
+        if generation == self._generation:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: Any):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self.results_bytes -= self._sizes.pop(key, 0)
+        while self.results_bytes + size > self.max_bytes and len(self.results):
+            self.results.popitem()
+        self.results.set(key, value)
+        self._sizes[key] = size
+        self.results_bytes += size
+
+    # Evictions and expiries, clear() doesn't report here
+    def _on_delete(self, key: Hashable, value: Any, cause):
+        self.results_bytes -= self._sizes.pop(key, 0)
+
+    def on_change(self, change: dict):
+        self._generation += 1
+        self.results.clear()
+        self._sizes.clear()
+        self.results_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self.results),
+            "bytes": self.results_bytes,
+            "compiled_filters": len(self.compiled),
+        }
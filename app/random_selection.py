@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import random
+from typing import List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from .query_cache import QueryCache, cache_key
+
+# Every Archive document carries a uniform random key in [0, 1). Picking the first
+# document at or after a random point is an index seek, so the cost of a draw does
+# not depend on how many documents match the filter.
+RANDOM_KEY = "random_key"
+
+logger = logging.getLogger(__name__)
+
+# Assigns keys to documents inserted without one, a no-op once the collection is backfilled
+async def backfill_random_keys(collection):
+    try:
+        res = await collection.update_many({RANDOM_KEY: {"$exists": False}}, [{"$set": {RANDOM_KEY: {"$rand": {}}}}])
+        if res.modified_count:
+            logger.info("Assigned random keys to %d documents", res.modified_count)
+    except PyMongoError:
+        logger.exception("Random key backfill failed, /random falls back to $sample for unkeyed documents")
+
+async def draw_by_random_key(collection, match: dict, projection: Optional[dict]) -> Optional[dict]:
+    point = random.random()
+    doc = await collection.find_one({**match, RANDOM_KEY: {"$gte": point}}, projection, sort=[(RANDOM_KEY, ASCENDING)])
+    if doc is None:
+        # Wrap around to the smallest key
+        doc = await collection.find_one({**match, RANDOM_KEY: {"$lt": point}}, projection, sort=[(RANDOM_KEY, ASCENDING)])
+    return doc
+
+# Draws in parallel, then tops up duplicates with draws that exclude what was already
+# chosen, until there are size documents or the match has none left
+async def sample_by_random_key(collection, match: dict, size: int, projection: Optional[dict]) -> List[dict]:
+    chosen: dict = {}
+    while len(chosen) < size:
+        remaining = {**match, "_id": {"$nin": list(chosen)}} if chosen else match
+        docs = await asyncio.gather(*(draw_by_random_key(collection, remaining, projection) for _ in range(size - len(chosen))))
+        if not any(docs):
+            break
+        for doc in docs:
+            if doc is not None:
+                chosen.setdefault(doc["_id"], doc)
+    return list(chosen.values())
+
+# Full-text matches can't use the key index, so the matching ids are cached per
+# filter and sampled in memory; the pool is dropped whenever Archive changes.
+async def sample_from_id_pool(collection, query_cache: QueryCache, pipeline: List[dict], size: int, projection: Optional[dict]) -> List[dict]:
+    async def load_ids():
+        res = await (await collection.aggregate([*pipeline, {"$project": {"_id": 1}}])).to_list()
+        return [doc["_id"] for doc in res]
+    pool = await query_cache.get_or_load(cache_key("random_pool", pipeline), load_ids)
+    ids = random.sample(pool, min(size, len(pool)))
+    docs = await collection.find({"_id": {"$in": ids}}, projection).to_list()
+    random.shuffle(docs)
+    return docs
@@ -0,0 +1,70 @@
+import gzip
+import hashlib
+from typing import Optional
+
+import orjson
+from fastapi import Request, Response, status
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+# Bodies smaller than this aren't worth the CPU or the Content-Encoding header
+MIN_COMPRESS_SIZE = 1024
+# Larger bodies are compressed off the event loop
+THREADPOOL_COMPRESS_SIZE = 256 * 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Stored documents go straight to JSON, ingest already validated them against the models
+def encode_documents(docs) -> bytes:
+    return orjson.dumps(docs, default=str)
+
+def weak_etag(body: bytes) -> str:
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+# Weak comparison as If-None-Match requires, so W/"x" matches "x"
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+# Picks br or gzip by q-value, br wins ties when brotli is installed
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            weights[coding.strip().lower()] = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            continue
+    offered = ["br", "gzip"] if brotli else ["gzip"]
+    # * stands for any coding not listed explicitly
+    q = {coding: weights.get(coding, weights.get("*", 0.0)) for coding in offered}
+    best = max(offered, key=lambda coding: q[coding])
+    return best if q[best] > 0 else None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+# JSON body with a weak ETag over the uncompressed bytes, 304 on a matching If-None-Match,
+# compressed with whichever encoding the client prefers
+async def conditional_json(request: Request, body: bytes, headers: dict = None) -> Response:
+    etag = weak_etag(body)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        if len(body) >= THREADPOOL_COMPRESS_SIZE:
+            body = await run_in_threadpool(compress, body, encoding)
+        else:
+            body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
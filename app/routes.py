@@ -1,93 +1,139 @@
 from __future__ import annotations
 
 from bson import ObjectId
-from fastapi import APIRouter, Request, HTTPException, status, Depends
-from typing import List, Union
+from bson.errors import InvalidId
+from fastapi import APIRouter, Request, Response, HTTPException, status, Depends
+from pydantic import TypeAdapter
+from typing import List, Optional, Union
 from fastapi.responses import StreamingResponse
+import base64
 import json
 
 from .oidc_auth import oidc_auth
-from .models import FolkloreCollection
+from .models import FolkloreCollection, FolkloreSearchPage, FolkloreSummary, FULL_PROJECTION, SUMMARY_PROJECTION
+from .downloads import presigned_redirect, stream_s3_object
+from .export import export_zip
+from .query_cache import cache_key
+from .random_selection import sample_by_random_key, sample_from_id_pool
+from .responses import conditional_json, encode_documents, etag_matches
 router = APIRouter(dependencies=[Depends(oidc_auth)])
 
-# Store thesaurus mapping to avoid repeated DB queries + small size
-mapto_mapfrom : dict[str, dict[str, List[str]]] = {}
-mapfrom_mapto : dict[str, dict[str, str]] = {}
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 200
+full_list_adapter = TypeAdapter(List[FolkloreCollection])
+summary_list_adapter = TypeAdapter(List[FolkloreSummary])
 
 @router.get("/", response_description="List all folklore based on an optional filter", response_model=List[FolkloreCollection])
-def list_folklore(request: Request, filters: str = None):
-    query_filters, search_stage = filter_from_json_str(filters, request)
-    if not search_stage:
-        return list(request.app.database["Archive"].find(query_filters).limit(500))
-    pipeline = build_pipeline(query_filters, search_stage, [{"$limit": 500}])
-    return list(request.app.database["Archive"].aggregate(pipeline))
+async def list_folklore(request: Request, filters: str = None, view: str = "full"):
+    projection = view_projection(view)
+    query_filters, search_stage = await filter_from_json_str(filters, request)
+    async def load():
+        if not search_stage:
+            return await find_archive(request, query_filters, projection).limit(500).to_list()
+        pipeline = build_pipeline(query_filters, search_stage, [{"$limit": 500}], projection)
+        return await aggregate_archive(request, pipeline)
+    key = cache_key("list", query_filters, search_stage, view)
+    return await list_response(request, await request.app.state.query_cache.get_or_load(key, load), projection)
 
 @router.get("/paginated", response_description="List folklore specified by page size, page, and optional filters", response_model=List[FolkloreCollection])
-def list_paginated_folklore(request: Request, page_size: int = 20, page: int = 1, filters: str = None):
-    query_filters, search_stage = filter_from_json_str(filters, request)
+async def list_paginated_folklore(request: Request, page_size: int = 20, page: int = 1, filters: str = None, cursor: str = None, view: str = "full"):
+    projection = view_projection(view)
+    query_filters, search_stage = await filter_from_json_str(filters, request)
     page = max(page, 1)
     page_size = max(min(page_size, 20), 1)
-    if not search_stage:
-        return list(request.app.database["Archive"].find(query_filters).skip((page - 1) * page_size).limit(page_size))
-    extra_stages = [{"$skip": (page - 1) * page_size}, {"$limit": page_size}]
-    pipeline = build_pipeline(query_filters, search_stage, extra_stages)
-    return list(request.app.database["Archive"].aggregate(pipeline))
+    # Passing cursor (empty for the first page) switches to keyset pagination, next token is sent in X-Next-Cursor
+    if cursor is not None:
+        after = decode_page_cursor(cursor, search_stage is not None)
+        key = cache_key("keyset", query_filters, search_stage, after, page_size, view)
+        res = await request.app.state.query_cache.get_or_load(
+            key, lambda: keyset_page(request, query_filters, search_stage, after, page_size, projection)
+        )
+        headers = {}
+        if len(res) == page_size:
+            headers["X-Next-Cursor"] = encode_page_cursor(res[-1], search_stage is not None)
+        return await list_response(request, res, projection, headers)
+    async def load():
+        if not search_stage:
+            return await find_archive(request, query_filters, projection).skip((page - 1) * page_size).limit(page_size).to_list()
+        extra_stages = [{"$skip": (page - 1) * page_size}, {"$limit": page_size}]
+        pipeline = build_pipeline(query_filters, search_stage, extra_stages, projection)
+        return await aggregate_archive(request, pipeline)
+    key = cache_key("page", query_filters, search_stage, page, page_size, view)
+    return await list_response(request, await request.app.state.query_cache.get_or_load(key, load), projection)
 
 @router.get("/languages", response_description="List all languages of origin", response_model=List[str])
-def list_languages(request: Request):
-    genres = list(request.app.database["Archive"].distinct('folklore.language_of_origin'))
+async def list_languages(request: Request):
+    genres = await request.app.state.facets.distinct('folklore.language_of_origin')
     return genres
 
 @router.get("/language/{language}", response_description="Get all of given language of origin", response_model=List[FolkloreCollection])
-def get_language(language: str, request: Request):
-    folklore = list(request.app.database["Archive"].find({"folklore.language_of_origin": language}))
-    return folklore
+async def get_language(language: str, request: Request, view: str = "full"):
+    projection = view_projection(view)
+    if wants_ndjson(request):
+        cursor = request.app.database["Archive"].find({"folklore.language_of_origin": language}, projection, batch_size=STREAM_BATCH_SIZE)
+        return ndjson_response(request, cursor, projection)
+    folklore = await request.app.database["Archive"].find({"folklore.language_of_origin": language}, projection).to_list()
+    return await list_response(request, folklore, projection)
 
 @router.get("/genres", response_description="List all possible genres", response_model=List[str])
-def list_genres(request: Request):
-    genres = list(request.app.database["Archive"].distinct('folklore.genre'))
+async def list_genres(request: Request):
+    genres = await request.app.state.facets.distinct('folklore.genre')
     return genres
 
 @router.get("/genre/{genre}", response_description="Get all of given genre", response_model=List[FolkloreCollection])
-def get_genre(genre: str, request: Request):
-    folklore = list(request.app.database["Archive"].find({"folklore.genre": genre}))
-    return folklore
+async def get_genre(genre: str, request: Request, view: str = "full"):
+    projection = view_projection(view)
+    if wants_ndjson(request):
+        cursor = request.app.database["Archive"].find({"folklore.genre": genre}, projection, batch_size=STREAM_BATCH_SIZE)
+        return ndjson_response(request, cursor, projection)
+    folklore = await request.app.database["Archive"].find({"folklore.genre": genre}, projection).to_list()
+    return await list_response(request, folklore, projection)
 
-@router.get("/random", response_description="Get a single folklore entry randomly with optional filter", response_model=List[FolkloreCollection])
-def random_folklore(request: Request, filters: str = None, folder_path_str: str = None):
+@router.get("/random", response_description="Get folklore entries randomly (one by default) with optional filter", response_model=List[FolkloreCollection])
+async def random_folklore(request: Request, filters: str = None, folder_path_str: str = None, view: str = "full", size: int = 1):
+    projection = view_projection(view)
+    size = max(min(size, 20), 1)
+    collection = request.app.database["Archive"]
     # Only allow 1 query parameter, either filters for map/table view or folder for index view
-    pipeline = []
+    search_stage = None
     if folder_path_str:
-        folder_path = json.loads(folder_path_str)
-        folder_dict : dict[str, str] = {}
-        # Query to find documents in same folder path
-        for i, folder in enumerate(folder_path):
-            if i == 0: folder_dict["archive_index.geography"] = folder
-            elif i == 1: folder_dict["archive_index.genre"] = folder
-            else: folder_dict[f"archive_index.sub_category_{i - 1}"] = folder
-        pipeline.append({"$match": folder_dict})
+        query_filters = folder_filter(json.loads(folder_path_str))
     else:
-        query_filters, search_stage = filter_from_json_str(filters, request)
+        query_filters, search_stage = await filter_from_json_str(filters, request)
+    if search_stage:
         pipeline = build_pipeline(query_filters, search_stage)
-    pipeline.append({"$sample": {"size": 1}})
-    return list(request.app.database["Archive"].aggregate(pipeline))
+        res = await sample_from_id_pool(collection, request.app.state.query_cache, pipeline, size, projection)
+        return Response(content=serialize_view(request, res, projection), media_type="application/json")
+    res = await sample_by_random_key(collection, query_filters, size, projection)
+    if not res:
+        # Documents not yet backfilled with a random key, fall back to $sample
+        pipeline = build_pipeline(query_filters, None, [{"$sample": {"size": size}}], projection)
+        res = await aggregate_archive(request, pipeline)
+    return Response(content=serialize_view(request, res, projection), media_type="application/json")
 
 @router.get("/count", response_description="Get the number of entries in the archive with optional filter", response_model=int)
-def num_entries(request: Request, filters: str = None):
-    query_filters, search_stage = filter_from_json_str(filters, request)
-    pipeline = build_pipeline(query_filters, search_stage, [{"$count": "total"}])
-    res = list(request.app.database["Archive"].aggregate(pipeline))
-    return res[0]["total"] if res else 0
+async def num_entries(request: Request, filters: str = None):
+    query_filters, search_stage = await filter_from_json_str(filters, request)
+    async def load():
+        pipeline = build_pipeline(query_filters, search_stage, [{"$count": "total"}])
+        res = await aggregate_archive(request, pipeline)
+        return res[0]["total"] if res else 0
+    total = await request.app.state.query_cache.get_or_load(cache_key("count", query_filters, search_stage), load)
+    return await conditional_json(request, encode_documents(total))
 
 @router.get("/folderContents", response_description="Get the name of folders or entries in the current folder path specified by query parameter", response_model=List[
     Union[str, FolkloreCollection]])
-def get_folder_names(request: Request, folder_path_str: str = None, return_elems: bool = False):
+async def get_folder_names(request: Request, folder_path_str: str = None, return_elems: bool = False):
     if not folder_path_str: folder_path = []
     else: folder_path = json.loads(folder_path_str)
 
+    # Folder names come from the in-memory tree once it is built
+    if not return_elems and (children := await request.app.state.folder_tree.children(folder_path)) is not None:
+        return children
+
     # No need for match pipeline
     if len(folder_path) == 0:
-        res = list(request.app.database["Archive"].distinct("archive_index.geography"))
+        res = await request.app.state.facets.distinct("archive_index.geography")
         return res
     
     folder_dict : dict[str, str] = {}
@@ -106,61 +152,152 @@ def get_folder_names(request: Request, folder_path_str: str = None, return_elems
     pipeline = [{"$match": folder_dict}]
     if not return_elems:
         pipeline.append({"$group": {"_id": f"${next_layer}"}})
-    res = list(request.app.database["Archive"].aggregate(pipeline))
+    elif wants_ndjson(request):
+        return ndjson_response(request, await request.app.database["Archive"].aggregate(pipeline, batchSize=STREAM_BATCH_SIZE))
+    res = await aggregate_archive(request, pipeline)
     if return_elems:
         return res
     res = [e["_id"] for e in res if e["_id"] is not None]
     return res
 
+@router.get("/folderTree", response_description="Get the folder tree, or the subtree at folder_path_str, with item counts per folder")
+async def get_folder_tree(request: Request, folder_path_str: str = None):
+    folder_path = json.loads(folder_path_str) if folder_path_str else []
+    tree = request.app.state.folder_tree
+    if not await tree.ready():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Folder tree is not available")
+    if (rendered := tree.render(folder_path)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Folder {folder_path} not found")
+    body, etag = rendered
+    # private: the tree is only served to logged in users, no-cache: revalidate with the ETag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/filters", response_description="Get available options for specified filter fields in the archive", response_model=dict[str, List[str]])
-def get_filters(request: Request, field_to_path: str = None):
+async def get_filters(request: Request, field_to_path: str = None):
     if not field_to_path:
         return []
-    populate_thesaurus_maps(request)
+    thesaurus = await request.app.state.thesaurus.get()
     field_to_path_dict: dict[str, str] = json.loads(field_to_path)
     unique_options: dict[str, list[str]] = {}
     for field_key in field_to_path_dict:
-        unique_options[field_key] = list(request.app.database["Archive"].distinct(field_to_path_dict[field_key]))
+        unique_options[field_key] = await request.app.state.facets.distinct(field_to_path_dict[field_key])
         if None in unique_options[field_key]:
             unique_options[field_key].remove(None)
         # Convert options to a smaller set to resolve formatting mistakes
         if field_key in ["genre", "language_of_origin"]:
             for i, value in enumerate(unique_options[field_key]):
-                unique_options[field_key][i] = mapfrom_mapto[field_key][value]
+                unique_options[field_key][i] = thesaurus.mapfrom_mapto[field_key].get(value, value)
 
     return unique_options
 
+@router.get("/search", response_description="Get a page of folklore, the total count, and facet counts for the same filters in one query", response_model=FolkloreSearchPage)
+async def search_folklore(request: Request, page_size: int = 20, page: int = 1, filters: str = None, field_to_path: str = None):
+    query_filters, search_stage = await filter_from_json_str(filters, request)
+    page = max(page, 1)
+    page_size = max(min(page_size, 20), 1)
+    field_to_path_dict: dict[str, str] = json.loads(field_to_path) if field_to_path else {}
+    thesaurus = await request.app.state.thesaurus.get()
+    async def load():
+        page_stages = [{"$skip": (page - 1) * page_size}, {"$limit": page_size}]
+        if search_stage:
+            pipeline = build_search_meta_pipeline(query_filters, search_stage, field_to_path_dict, page_stages)
+        else:
+            pipeline = build_facet_pipeline(query_filters, field_to_path_dict, page_stages)
+        res = await aggregate_archive(request, pipeline)
+        return parse_facet_result(res[0], field_to_path_dict, search_stage is not None, thesaurus)
+    key = cache_key("search", query_filters, search_stage, field_to_path_dict, page, page_size, thesaurus.version)
+    return await request.app.state.query_cache.get_or_load(key, load)
+
+@router.get("/export", response_description="Download a ZIP of the PDFs and a metadata manifest for a filter or folder path")
+async def export_folklore(request: Request, filters: str = None, folder_path_str: str = None, manifest_format: str = "jsonl"):
+    if manifest_format not in ["jsonl", "csv"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown manifest format {manifest_format}")
+    collection = request.app.database["Archive"]
+    search_stage = None
+    if folder_path_str:
+        query_filters = folder_filter(json.loads(folder_path_str))
+    else:
+        query_filters, search_stage = await filter_from_json_str(filters, request)
+    async def open_cursor():
+        if not search_stage:
+            return collection.find(query_filters, batch_size=STREAM_BATCH_SIZE)
+        return await collection.aggregate(build_pipeline(query_filters, search_stage), batchSize=STREAM_BATCH_SIZE)
+    return StreamingResponse(
+        content=export_zip(open_cursor, request.app.s3, manifest_format, prefetch=request.app.downloads.export_prefetch),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="folklore-export.zip"'},
+    )
+
+@router.get("/queryPlans", response_description="Get query plans flagged by diagnostics mode (QUERY_DIAGNOSTICS=true)", response_model=List[dict])
+async def query_plans(request: Request):
+    if not request.app.state.plans:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Query diagnostics are disabled")
+    return list(request.app.state.plans.findings)
+
+@router.get("/cacheStats", response_description="Get hit/miss counts of the in-memory caches", response_model=dict[str, dict])
+async def cache_stats(request: Request):
+    return collect_cache_stats(request.app)
+
 @router.get("/{id}", response_description="Get a single folklore entry by id", response_model=FolkloreCollection)
-def find_folklore(id: str, request: Request):
-    if (folklore := request.app.database["Archive"].find_one({"_id": ObjectId(id)})) is not None:
+async def find_folklore(id: str, request: Request):
+    if (folklore := await request.app.database["Archive"].find_one({"_id": ObjectId(id)})) is not None:
         return folklore
 
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Folklore with ID {id} not found")
 
-@router.get("/{id}/download", response_description="Download a single folklore entry by id")
-def download_folklore(id: str, request: Request):
-    if (folklore := request.app.database["Archive"].find_one({"_id": ObjectId(id)})) is not None:
+@router.get("/{id}/download", response_description="Download a single folklore entry by id, supports Range and If-None-Match")
+async def download_folklore(id: str, request: Request, redirect: bool = None):
+    if (folklore := await request.app.database["Archive"].find_one({"_id": ObjectId(id)}, {"filename": 1})) is not None:
         path = folklore["filename"]
-        try:
-            result = request.app.s3.get_object(Bucket="folklorearchive", Key=path)
-            return StreamingResponse(content=result["Body"].iter_chunks())
-        except Exception as e:
-            if hasattr(e, "message"):
-                raise HTTPException(
-                    status_code=e.message["response"]["Error"]["Code"],
-                    detail=e.message["response"]["Error"]["Message"],
-                )
+        # Explicit redirect parameter overrides the deployment's DOWNLOAD_MODE
+        if request.app.downloads.redirect if redirect is None else redirect:
+            return presigned_redirect(request, path, request.app.downloads.presign_ttl)
+        if request.app.file_cache and (cached := await request.app.file_cache.response(request, path)) is not None:
+            return cached
+        return await stream_s3_object(request, path)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Folklore with ID {id} not found")
 
 # Helper functions
 
+# Shared by /cacheStats and the cache gauges on /metrics
+def collect_cache_stats(app) -> dict[str, dict]:
+    return {
+        "facets": app.state.facets.stats(),
+        "thesaurus": app.state.thesaurus.stats(),
+        "queries": app.state.query_cache.stats(),
+        "jwks": app.state.jwks.stats(),
+        "verified_tokens": {"entries": len(app.state.verified_tokens)},
+        "files": app.file_cache.stats() if app.file_cache else {},
+        "folder_tree": app.state.folder_tree.stats(),
+    }
+
+# Query to find documents in same folder path
+def folder_filter(folder_path: List[str]) -> dict[str, str]:
+    folder_dict : dict[str, str] = {}
+    for i, folder in enumerate(folder_path):
+        if i == 0: folder_dict["archive_index.geography"] = folder
+        elif i == 1: folder_dict["archive_index.genre"] = folder
+        else: folder_dict[f"archive_index.sub_category_{i - 1}"] = folder
+    return folder_dict
+
 # Converts filter string into query dictionary for mongodb
-def filter_from_json_str(filters: str, request: Request):
+# Compiled filters are cached per thesaurus version, callers must not mutate the result
+async def filter_from_json_str(filters: str, request: Request):
     if not filters:
-        return {}
-    populate_thesaurus_maps(request)
-    filters_dict: dict[str, List[str] | str] = json.loads(filters)
+        return {}, None
+    thesaurus = await request.app.state.thesaurus.get()
+    compiled_cache = request.app.state.query_cache.compiled
+    key = (thesaurus.version, filters)
+    if (compiled := compiled_cache.get(key)) is None:
+        compiled = compile_filters(json.loads(filters), thesaurus)
+        compiled_cache.set(key, compiled)
+    return compiled
+
+def compile_filters(filters_dict: dict[str, List[str] | str], thesaurus):
     query_filters = {} # Need to remove empty filters
     search_stage = None # If cleaned_full_text is in filters
 
@@ -175,36 +312,180 @@ def filter_from_json_str(filters: str, request: Request):
         else:
             reduced_key = field_key.split(".")[-1] # field_key has format path.field
             # Check if reduced_key has no mapping
+            # Sorted so equivalent selections share cached results
             if reduced_key not in ["genre", "language_of_origin"]:
-                query_filters[field_key] = {"$in": values}
+                query_filters[field_key] = {"$in": sorted(values)}
                 continue
             expanded_values : List[str] = []
             for v in values:
-                expanded_values.extend(mapto_mapfrom[reduced_key][v])
-            query_filters[field_key] = {"$in": expanded_values}
+                expanded_values.extend(thesaurus.mapto_mapfrom[reduced_key][v])
+            query_filters[field_key] = {"$in": sorted(expanded_values)}
     return query_filters, search_stage
 
+# Results, total and facet buckets from a single $facet over the $match
+def build_facet_pipeline(query_filters: dict, field_to_path: dict[str, str], page_stages: List[dict]):
+    facet = {"results": page_stages, "total": [{"$count": "total"}]}
+    for i, path in enumerate(field_to_path.values()):
+        facet[f"facet_{i}"] = [{"$unwind": f"${path}"}, {"$group": {"_id": f"${path}", "count": {"$sum": 1}}}]
+    return build_pipeline(query_filters, None, [{"$facet": facet}])
+
+# Full-text variant, Atlas computes the total and facets as $$SEARCH_META alongside the hits.
+# Filters move into the $search compound so the counts honor them, which requires the
+# filter and facet paths to be indexed as token/stringFacet in the "search" index.
+def build_search_meta_pipeline(query_filters: dict, search_stage: dict, field_to_path: dict[str, str], page_stages: List[dict]):
+    operator = search_operator(query_filters, search_stage)
+    search = {"index": search_stage["$search"]["index"], "count": {"type": "total"}}
+    if field_to_path:
+        search["facet"] = {"operator": operator, "facets": {
+            f"facet_{i}": {"type": "string", "path": path, "numBuckets": 1000}
+            for i, path in enumerate(field_to_path.values())
+        }}
+    else:
+        search.update(operator)
+    # Paging inside the results branch, so meta still sees a hit on pages past the last one
+    return [{"$search": search}, {"$facet": {
+        "results": page_stages,
+        "meta": [{"$replaceWith": "$$SEARCH_META"}, {"$limit": 1}],
+    }}]
+
+# The text query with the $in filters folded into a compound, so Atlas applies them while matching
+def search_operator(query_filters: dict, search_stage: dict) -> dict:
+    operator = {"text": search_stage["$search"]["text"]}
+    if query_filters:
+        operator = {"compound": {
+            "must": [operator],
+            "filter": [{"in": {"path": path, "value": cond["$in"]}} for path, cond in query_filters.items()],
+        }}
+    return operator
+
+# Normalizes either pipeline's output, folding facet values through the thesaurus like /filters
+def parse_facet_result(res: dict, field_to_path: dict[str, str], from_search: bool, thesaurus) -> dict:
+    if from_search:
+        meta = res["meta"][0] if res["meta"] else {}
+        total = meta.get("count", {}).get("total", 0)
+        buckets = {name: facet["buckets"] for name, facet in meta.get("facet", {}).items()}
+    else:
+        total = res["total"][0]["total"] if res["total"] else 0
+        buckets = {name: res[name] for name in res if name.startswith("facet_")}
+    facets: dict[str, dict[str, int]] = {}
+    for i, field_key in enumerate(field_to_path):
+        counts: dict[str, int] = {}
+        for bucket in buckets.get(f"facet_{i}", []):
+            value = bucket["_id"]
+            if value is None:
+                continue
+            if field_key in ["genre", "language_of_origin"]:
+                value = thesaurus.mapfrom_mapto[field_key].get(value, value)
+            counts[value] = counts.get(value, 0) + bucket["count"]
+        facets[field_key] = counts
+    return {"results": res["results"], "total": total, "facets": facets}
+
+# Archive queries go through these so diagnostics mode can explain their plans
+async def aggregate_archive(request: Request, pipeline: List[dict]) -> list:
+    if request.app.state.plans:
+        request.app.state.plans.observe(pipeline)
+    return await (await request.app.database["Archive"].aggregate(pipeline)).to_list()
+
+def find_archive(request: Request, query_filters: dict, projection: Optional[dict] = None):
+    if request.app.state.plans:
+        request.app.state.plans.observe([{"$match": query_filters}])
+    return request.app.database["Archive"].find(query_filters, projection)
+
+# Opt-in streaming for unbounded list endpoints via the Accept header
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+# Writes each document as soon as it is serialized instead of materializing the whole cursor
+def ndjson_response(request: Request, cursor, projection: Optional[dict] = None) -> StreamingResponse:
+    model = FolkloreSummary if projection is SUMMARY_PROJECTION else FolkloreCollection
+    fast = request.app.state.fast_responses
+    async def stream():
+        try:
+            async for doc in cursor:
+                if fast:
+                    yield encode_documents(doc) + b"\n"
+                else:
+                    yield model.model_validate(doc).model_dump_json(by_alias=True) + "\n"
+        finally:
+            await cursor.close()
+    return StreamingResponse(content=stream(), media_type=NDJSON_MEDIA_TYPE)
+
+# Documents are always fetched with the projection of their view, so the fast path emits the same fields.
+# view=summary trims documents to the fields the map and table views display
+def view_projection(view: str) -> dict:
+    if view == "full":
+        return FULL_PROJECTION
+    if view == "summary":
+        return SUMMARY_PROJECTION
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown view {view}")
+
+# List bodies bypass the route's response_model: validated + encoded in one pass by pydantic,
+# or with FAST_RESPONSES=true encoded as stored by orjson
+def serialize_view(request: Request, docs: list, projection: dict) -> bytes:
+    if request.app.state.fast_responses:
+        # _token only rides along for the keyset cursor
+        if docs and "_token" in docs[0]:
+            docs = [{k: v for k, v in doc.items() if k != "_token"} for doc in docs]
+        return encode_documents(docs)
+    adapter = summary_list_adapter if projection is SUMMARY_PROJECTION else full_list_adapter
+    return adapter.dump_json(adapter.validate_python(docs), by_alias=True)
+
+async def list_response(request: Request, docs: list, projection: dict, headers: dict = None) -> Response:
+    return await conditional_json(request, serialize_view(request, docs, projection), headers)
+
+# Fetches the page after the given keyset position, ordered by _id or by search score then _id
+async def keyset_page(request: Request, query_filters: dict, search_stage: dict, after: Optional[dict], page_size: int, projection: Optional[dict] = None):
+    if not search_stage:
+        if after:
+            query_filters = {**query_filters, "_id": {"$gt": after["id"]}}
+        return await find_archive(request, query_filters, projection).sort("_id", 1).limit(page_size).to_list()
+    return await aggregate_archive(request, build_search_after_pipeline(query_filters, search_stage, after, page_size, projection))
+
+# Full-text pages are sorted by score then _id inside Atlas Search and resume from the last
+# hit's searchSequenceToken, so mongot picks up where the previous page stopped instead of
+# every hit being re-sorted per page. Sorting on _id needs it indexed as objectId in "search".
+def build_search_after_pipeline(query_filters: dict, search_stage: dict, after: Optional[dict], page_size: int, projection: Optional[dict] = None):
+    search = {
+        "index": search_stage["$search"]["index"],
+        **search_operator(query_filters, search_stage),
+        "sort": {"score": {"$meta": "searchScore"}, "_id": 1},
+    }
+    if after:
+        search["searchAfter"] = after["token"]
+    pipeline = [{"$search": search}, {"$limit": page_size}, {"$addFields": {"_token": {"$meta": "searchSequenceToken"}}}]
+    if projection:
+        # Keep the token through the projection, the next cursor is built from it
+        pipeline.append({"$project": {**projection, "_token": 1}})
+    return pipeline
+
+# Opaque continuation token holding the sort key of the last document on a page
+def encode_page_cursor(doc: dict, with_token: bool) -> str:
+    key = {"id": str(doc["_id"])}
+    if with_token:
+        key["token"] = doc["_token"]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+# A cursor only resumes the mode it was issued in, full-text pages carry a search token
+def decode_page_cursor(cursor: str, with_token: bool) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key["id"] = ObjectId(key["id"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+    if with_token != isinstance(key.get("token"), str):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pagination cursor does not match the filters, restart from an empty cursor")
+    return key
+
 # Template for building mongodb pipeline
-def build_pipeline(query_filters: dict, search_stage: dict, extra_stages: List[dict] = []):
+def build_pipeline(query_filters: dict, search_stage: dict, extra_stages: List[dict] = [], projection: dict = None):
     pipeline = []
     if search_stage:
         pipeline.append(search_stage)
     if query_filters:
         pipeline.append({"$match": query_filters})
     pipeline.extend(extra_stages)
+    if projection:
+        pipeline.append({"$project": projection})
     return pipeline
-
-def populate_thesaurus_maps(request):
-    if len(mapto_mapfrom) != 0 or len(mapfrom_mapto) != 0:
-        return
-    thesaurus_documents = list(request.app.database["Thesaurus"].find())
-    for entry in thesaurus_documents:
-        # Populate mapto_mapfrom to support backend mapping frontend options to cleaner subset
-        if entry["type"] not in mapto_mapfrom:
-            mapto_mapfrom[entry["type"]] = {}
-        mapto_mapfrom[entry["type"]][entry["maps_to"]] = entry["maps_from"]
-        # Populate mapfrom_mapto to support mapping frontend options back to original set
-        if entry["type"] not in mapfrom_mapto:
-            mapfrom_mapto[entry["type"]] = {}
-        for e in entry["maps_from"]:
-            mapfrom_mapto[entry["type"]][e] = entry["maps_to"]
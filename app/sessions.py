@@ -0,0 +1,142 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from cacheout import Cache
+from starlette.concurrency import run_in_threadpool
+
+# Login sessions keyed by the session_id cookie. Backends only differ in where payloads
+# live; sliding expiry is shared here and writes at most once per refresh_interval per
+# session, so a busy user doesn't cause a write on every request.
+class SessionStore(ABC):
+    def __init__(self, ttl: float, refresh_interval: float):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._touched = Cache(maxsize=65536, ttl=refresh_interval, default=None)
+
+    async def setup(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, session_id: str, payload: dict):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    async def _extend(self, session_id: str, payload: dict):
+        ...
+
+    # Resets the inactivity timeout
+    async def touch(self, session_id: str, payload: dict):
+        if self._touched.get(session_id) is not None:
+            return
+        self._touched.set(session_id, True)
+        await self._extend(session_id, payload)
+
+# Per-process store, sessions are lost on restart and not shared between workers
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl: float, refresh_interval: float, maxsize: int = 65536):
+        super().__init__(ttl, refresh_interval)
+        self._sessions = Cache(maxsize=maxsize, ttl=ttl, default=None)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        return self._sessions.get(session_id)
+
+    async def set(self, session_id: str, payload: dict):
+        self._sessions.set(session_id, payload)
+
+    async def delete(self, session_id: str):
+        self._sessions.delete(session_id)
+
+    async def _extend(self, session_id: str, payload: dict):
+        self._sessions.set(session_id, payload)
+
+# Shared by every worker and replica, expired sessions are removed by a TTL index
+class MongoSessionStore(SessionStore):
+    def __init__(self, collection, ttl: float, refresh_interval: float):
+        super().__init__(ttl, refresh_interval)
+        self.collection = collection
+
+    def _expires_at(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    async def setup(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        # The TTL monitor only runs every minute, so check expiry explicitly
+        doc = await self.collection.find_one({"_id": session_id, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        return doc["payload"] if doc else None
+
+    async def set(self, session_id: str, payload: dict):
+        await self.collection.replace_one(
+            {"_id": session_id}, {"payload": payload, "expires_at": self._expires_at()}, upsert=True
+        )
+
+    async def delete(self, session_id: str):
+        await self.collection.delete_one({"_id": session_id})
+
+    async def _extend(self, session_id: str, payload: dict):
+        await self.collection.update_one({"_id": session_id}, {"$set": {"expires_at": self._expires_at()}})
+
+# File-backed store shared by the workers of a single host
+class SqliteSessionStore(SessionStore):
+    def __init__(self, path: str, ttl: float, refresh_interval: float):
+        super().__init__(ttl, refresh_interval)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    async def close(self):
+        self._conn.close()
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        row = await run_in_threadpool(
+            self._execute, "SELECT payload FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        )
+        return json.loads(row[0]) if row else None
+
+    async def set(self, session_id: str, payload: dict):
+        now = time.time()
+        await run_in_threadpool(self._execute, "DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        await run_in_threadpool(
+            self._execute, "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, json.dumps(payload), now + self.ttl)
+        )
+
+    async def delete(self, session_id: str):
+        await run_in_threadpool(self._execute, "DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    async def _extend(self, session_id: str, payload: dict):
+        await run_in_threadpool(
+            self._execute, "UPDATE sessions SET expires_at = ? WHERE id = ?", (time.time() + self.ttl, session_id)
+        )
+
+def create_session_store(backend: str, database, ttl: float, refresh_interval: float, sqlite_path: str) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(ttl, refresh_interval)
+    if backend == "mongodb":
+        return MongoSessionStore(database["Sessions"], ttl, refresh_interval)
+    if backend == "sqlite":
+        return SqliteSessionStore(sqlite_path, ttl, refresh_interval)
+    raise ValueError(f"Unknown session backend {backend}")
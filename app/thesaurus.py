@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from .change_feed import ChangeFeed
+
+logger = logging.getLogger(__name__)
+
+# Immutable snapshot of the Thesaurus collection, swapped as a whole on reload
+class ThesaurusMaps:
+    def __init__(self, documents: List[dict], version: int):
+        self.version = version
+        self.loaded_at = time.time()
+        self.mapto_mapfrom: dict[str, dict[str, List[str]]] = {}
+        self.mapfrom_mapto: dict[str, dict[str, str]] = {}
+        for entry in documents:
+            # Populate mapto_mapfrom to support backend mapping frontend options to cleaner subset
+            self.mapto_mapfrom.setdefault(entry["type"], {})[entry["maps_to"]] = entry["maps_from"]
+            # Populate mapfrom_mapto to support mapping frontend options back to original set
+            for e in entry["maps_from"]:
+                self.mapfrom_mapto.setdefault(entry["type"], {})[e] = entry["maps_to"]
+
+# Owns the thesaurus for the app: the first caller waits on a single shared load, after
+# that readers always get the current snapshot while refreshes run in the background,
+# triggered by the Thesaurus change feed or, without change streams, by ttl expiry.
+class Thesaurus:
+    def __init__(self, collection, feed: ChangeFeed, ttl: float = 300):
+        self.collection = collection
+        self.feed = feed
+        self.ttl = ttl
+        self._maps: Optional[ThesaurusMaps] = None
+        self._loading: Optional[asyncio.Task] = None
+        self._dirty = False
+        feed.subscribe(self.on_change)
+
+    async def get(self) -> ThesaurusMaps:
+        maps = self._maps
+        if maps is None:
+            self.refresh()
+            return await asyncio.shield(self._loading)
+        # _dirty also catches edits that landed while a reload was already running
+        if self._dirty or (not self.feed.active and time.time() - maps.loaded_at > self.ttl):
+            self.refresh()
+        return maps
+
+    def refresh(self):
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.create_task(self._reload())
+
+    def on_change(self, change: dict):
+        self._dirty = True
+        self.refresh()
+
+    async def _reload(self) -> ThesaurusMaps:
+        self._dirty = False
+        try:
+            documents = await self.collection.find().to_list()
+        except Exception:
+            self._dirty = True
+            if self._maps is None:
+                raise
+            logger.exception("Thesaurus refresh failed, keeping version %s", self._maps.version)
+            return self._maps
+        self._maps = ThesaurusMaps(documents, self._maps.version + 1 if self._maps else 1)
+        return self._maps
+
+    def stats(self) -> dict:
+        maps = self._maps
+        return {
+            "version": maps.version if maps else 0,
+            "loaded_at": maps.loaded_at if maps else None,
+            "change_stream_active": self.feed.active,
+        }
@@ -0,0 +1,90 @@
+"""Checks that a warm JWKS cache makes no outbound calls to the identity provider.
+
+    python benchmarks/jwks_cache_check.py --sessions 50 --requests 4
+
+Serves the real oidc_auth dependency with a local JWKS stand-in (httpx.MockTransport),
+logs in several sessions and sends repeated authenticated requests. Exits non-zero
+unless the JWKS endpoint was fetched exactly once.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from cacheout import Cache
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import Depends, FastAPI
+from jose import jwk, jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.auth import OidcClient  # noqa: E402
+from app.oidc_auth import AUDIENCE, ISSUER, JWKS_URL, JwksCache, oidc_auth  # noqa: E402
+from app.sessions import MemorySessionStore  # noqa: E402
+
+KID = "check"
+
+
+def signing_key() -> tuple:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    public = {**jwk.construct(pem, "RS256").public_key().to_dict(), "kid": KID, "use": "sig"}
+    return pem, public
+
+
+def build_app(transport: httpx.MockTransport) -> FastAPI:
+    app = FastAPI()
+    app.auth = OidcClient(client_id="check", client_secret="check", authority_url=ISSUER, redirect_url="",
+                          frontend_url="", issuer=ISSUER, audience=AUDIENCE)
+    app.state.session_store = MemorySessionStore(ttl=15 * 60, refresh_interval=60)
+    app.state.jwks = JwksCache(httpx.AsyncClient(transport=transport))
+    app.state.verified_tokens = Cache(maxsize=4096, ttl=0, default=None)
+
+    @app.get("/protected", dependencies=[Depends(oidc_auth)])
+    async def protected():
+        return {"ok": True}
+    return app
+
+
+async def run(sessions: int, requests: int) -> int:
+    pem, public = signing_key()
+    calls = []
+
+    def idp(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        if str(request.url) != JWKS_URL:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"keys": [public]})
+
+    app = build_app(httpx.MockTransport(idp))
+    now = int(time.time())
+    session_ids = []
+    for i in range(sessions):
+        claims = {"iss": ISSUER, "aud": AUDIENCE, "sub": f"user-{i}", "iat": now, "exp": now + 3600}
+        token = jwt.encode(claims, pem, algorithm="RS256", headers={"kid": KID})
+        await app.state.session_store.set(f"session-{i}", {"id_token": token, "access_token": f"access-{i}"})
+        session_ids.append(f"session-{i}")
+
+    statuses = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        for _ in range(requests):
+            responses = await asyncio.gather(*(
+                client.get("/protected", headers={"Cookie": f"session_id={session_id}"}) for session_id in session_ids
+            ))
+            statuses.extend(response.status_code for response in responses)
+
+    failed = sum(status != 200 for status in statuses)
+    print(f"{len(statuses)} authenticated requests, {failed} failed, {app.state.jwks.fetches} JWKS fetches, "
+          f"{len(calls)} outbound calls")
+    return 0 if failed == 0 and app.state.jwks.fetches == 1 and len(calls) == 1 else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=4, help="rounds of requests, each session once per round")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.sessions, args.requests)))
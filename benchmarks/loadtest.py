@@ -0,0 +1,299 @@
+"""Reproducible load test of the archive API against local stand-ins.
+
+    python benchmarks/loadtest.py --docs 5000 --concurrency 1,16,64 --duration 20 --output before.json
+    python benchmarks/loadtest.py --mongo-uri mongodb://localhost:27017 --docs 1000000 --output after.json
+
+Boots app.main:app in a child process on a seeded synthetic corpus (mongomock, or a local
+mongod with --mongo-uri), an in-process moto S3 bucket and a stub OIDC/JWKS provider. Logs
+in through /auth/callback, drives a weighted mix of endpoints at each concurrency level and
+writes p50/p95/p99 latency and requests/s per endpoint as JSON. Same --seed, same corpus and
+same request sequence per worker, so runs on different commits are comparable.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from standins import (  # noqa: E402
+    GENRES, GEOGRAPHIES, LANGUAGES, SUB_CATEGORIES, MongomockClient, StubIdp, document_id, free_port,
+    mongomock_database, seed_bucket, seed_database,
+)
+
+DEFAULT_MIX = "paginated=35,count=15,filters=10,folderContents=15,random=15,download=10"
+FIELD_TO_PATH = json.dumps({"genre": "folklore.genre", "language_of_origin": "folklore.language_of_origin"})
+
+# --- request mix ---
+
+def random_filters(rng: random.Random) -> str:
+    filters = {}
+    if rng.random() < 0.6:
+        filters["folklore.genre"] = rng.sample(GENRES, rng.randint(1, 2))
+    if rng.random() < 0.4:
+        filters["folklore.language_of_origin"] = [rng.choice(list(LANGUAGES))]
+    return json.dumps(filters)
+
+def random_folder(rng: random.Random, max_depth: int = 3) -> list:
+    levels = [GEOGRAPHIES, GENRES, SUB_CATEGORIES, SUB_CATEGORIES]
+    return [rng.choice(levels[i]) for i in range(rng.randint(0, max_depth))]
+
+def request_paginated(rng, docs):
+    params = {"page": rng.randint(1, max(min(docs // 20, 50), 1))}
+    if rng.random() < 0.5:
+        params["filters"] = random_filters(rng)
+    return params, "/folklore/paginated"
+
+def request_count(rng, docs):
+    return {"filters": random_filters(rng)} if rng.random() < 0.8 else {}, "/folklore/count"
+
+def request_filters(rng, docs):
+    return {"field_to_path": FIELD_TO_PATH}, "/folklore/filters"
+
+def request_folder_contents(rng, docs):
+    path = random_folder(rng)
+    return {"folder_path_str": json.dumps(path)} if path else {}, "/folklore/folderContents"
+
+def request_random(rng, docs):
+    if rng.random() < 0.5:
+        return {"folder_path_str": json.dumps(random_folder(rng, max_depth=2))}, "/folklore/random"
+    return {"filters": random_filters(rng)}, "/folklore/random"
+
+def request_download(rng, docs):
+    return {}, f"/folklore/{document_id(rng.randrange(docs))}/download"
+
+ENDPOINTS = {
+    "paginated": request_paginated,
+    "count": request_count,
+    "filters": request_filters,
+    "folderContents": request_folder_contents,
+    "random": request_random,
+    "download": request_download,
+}
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name} in --mix, expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight)
+    return weights
+
+# --- measurement ---
+
+def percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": latencies[-1] * 1000}
+
+def summarize(samples: list, elapsed: float) -> dict:
+    errors = Counter(status for _, status in samples if status != 200)
+    return {
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "error_statuses": dict(errors),
+        "rps": len(samples) / elapsed,
+        "latency_ms": percentiles([latency for latency, _ in samples]),
+    }
+
+async def worker(client: httpx.AsyncClient, rng: random.Random, session_id: str, names: list, weights: list,
+                 docs: int, deadline: float, samples: dict):
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        params, path = ENDPOINTS[name](rng, docs)
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, params=params, headers={"Cookie": f"session_id={session_id}"})
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        samples[name].append((time.perf_counter() - start, status))
+
+async def run_level(client: httpx.AsyncClient, sessions: list, mix: dict, docs: int, concurrency: int,
+                    duration: float, seed: int) -> dict:
+    samples: dict[str, list] = defaultdict(list)
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(client, random.Random(f"{seed}-{concurrency}-{i}"), sessions[i % len(sessions)],
+               list(mix), list(mix.values()), docs, deadline, samples)
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    everything = [sample for endpoint in samples.values() for sample in endpoint]
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        **summarize(everything, elapsed),
+        "endpoints": {name: summarize(samples[name], elapsed) for name in mix if samples[name]},
+    }
+
+# --- processes ---
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "app"], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+def app_environment(args, idp: StubIdp, base_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "ATLAS_URI": args.mongo_uri or "mongodb://mongomock",
+        "DB_NAME": args.db,
+        "OIDC_CLIENT_ID": "benchmark",
+        "OIDC_CLIENT_SECRET": "benchmark",
+        "OIDC_AUTHORITY_URL": idp.url,
+        "OIDC_REDIRECT_URL": base_url,
+        "OIDC_JWKS_URL": f"{idp.url}/jwks",
+        "OIDC_ISSUER": idp.url,
+        "OIDC_AUDIENCE": idp.audience,
+        "FRONTEND_URL": base_url,
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        # Indexes are built by the seeding step
+        "MONGO_MANAGE_INDEXES": "false",
+    })
+    return env
+
+async def wait_until_up(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"API process exited with {server.returncode} during startup")
+        try:
+            await client.get("/auth/current-user")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.25)
+    raise SystemExit(f"API did not come up within {timeout:.0f}s")
+
+# Each session goes through the real callback: token exchange with the stub, then the session store
+async def login(client: httpx.AsyncClient, n: int) -> list:
+    sessions = []
+    for i in range(n):
+        response = await client.get("/auth/callback", params={"code": f"benchmark-{i}"})
+        if "session_id" not in response.cookies:
+            raise SystemExit(f"Login failed with {response.status_code}: {response.text[:200]}")
+        sessions.append(response.cookies["session_id"])
+    return sessions
+
+async def drive(args, base_url: str, server: subprocess.Popen) -> dict:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_until_up(client, server, args.startup_timeout)
+        sessions = await login(client, args.sessions)
+        if args.warmup:
+            print(f"warming up for {args.warmup:.0f}s", file=sys.stderr)
+            await run_level(client, sessions, mix, args.docs, max(args.concurrency), args.warmup, args.seed - 1)
+        levels = []
+        for concurrency in args.concurrency:
+            level = await run_level(client, sessions, mix, args.docs, concurrency, args.duration, args.seed)
+            print(f"concurrency {concurrency:4}: {level['rps']:8.1f} req/s  p50 {level['latency_ms']['p50']:7.1f} ms  "
+                  f"p95 {level['latency_ms']['p95']:7.1f} ms  p99 {level['latency_ms']['p99']:7.1f} ms  "
+                  f"{level['errors']} errors", file=sys.stderr)
+            levels.append(level)
+        cache_stats = (await client.get("/folklore/cacheStats", headers={"Cookie": f"session_id={sessions[0]}"})).json()
+    return {"levels": levels, "cache_stats": cache_stats}
+
+def run(args):
+    from app.oidc_auth import AUDIENCE
+    idp = StubIdp(audience=AUDIENCE)
+    idp.start()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, os.path.abspath(__file__), "serve", "--port", str(port), "--docs", str(args.docs),
+               "--seed", str(args.seed), "--pdf-count", str(args.pdf_count), "--pdf-kb", str(args.pdf_kb),
+               "--db", args.db]
+    if args.mongo_uri:
+        command += ["--mongo-uri", args.mongo_uri]
+    if args.no_seed:
+        command.append("--no-seed")
+    server = subprocess.Popen(command, cwd=ROOT, env=app_environment(args, idp, base_url))
+    try:
+        results = asyncio.run(drive(args, base_url, server))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        idp.stop()
+    report = {
+        **git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "backend": "mongodb" if args.mongo_uri else "mongomock",
+            "docs": args.docs, "seed": args.seed, "mix": parse_mix(args.mix), "duration": args.duration,
+            "sessions": args.sessions, "pdf_count": args.pdf_count, "pdf_kb": args.pdf_kb,
+            "fast_responses": os.environ.get("FAST_RESPONSES", "false") == "true",
+        },
+        **results,
+        "jwks_requests": idp.jwks_requests,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+# Child process: seed the stand-ins and serve the app on them
+def serve(args):
+    import boto3
+    import uvicorn
+    from moto import mock_aws
+
+    import app.main
+    from app.downloads import BUCKET
+
+    with mock_aws():
+        seed_bucket(boto3.client("s3"), BUCKET, args.pdf_count, args.pdf_kb * 1024)
+        if args.mongo_uri:
+            if not args.no_seed:
+                from pymongo import MongoClient
+                client = MongoClient(args.mongo_uri)
+                seed_database(client[args.db], args.docs, args.seed, args.pdf_count)
+                client.close()
+        else:
+            database = mongomock_database()
+            seed_database(database, args.docs, args.seed, args.pdf_count)
+            app.main.AsyncMongoClient = lambda *a, **kw: MongomockClient(database)
+        print(f"seeded {args.docs} documents and {args.pdf_count} PDFs", file=sys.stderr)
+        uvicorn.run(app.main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", nargs="?", choices=["run", "serve"], default="run", help=argparse.SUPPRESS)
+    parser.add_argument("--mongo-uri", default=None, help="local mongod to seed and use instead of mongomock")
+    parser.add_argument("--db", default="archive_benchmark", help="database to (re)seed, its Archive and Thesaurus are replaced")
+    parser.add_argument("--no-seed", action="store_true", help="reuse a corpus seeded by an earlier run (--mongo-uri only)")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--pdf-count", type=int, default=100, help="distinct PDFs in the bucket, documents share them")
+    parser.add_argument("--pdf-kb", type=int, default=256)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--sessions", type=int, default=8, help="logged in sessions shared round-robin by the workers")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight pairs")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    serve(args) if args.mode == "serve" else run(args)
@@ -0,0 +1,85 @@
+"""Micro-benchmark of list response encoding: pydantic validation vs orjson, plus compression.
+
+Times the two FAST_RESPONSES paths on synthetic documents shaped like Archive records,
+no database needed:
+
+    python benchmarks/serialization.py --docs 500 --rounds 50
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models import SUMMARY_PROJECTION  # noqa: E402
+from app.responses import BROTLI_QUALITY, GZIP_LEVEL, brotli, encode_documents  # noqa: E402
+from app.routes import full_list_adapter, summary_list_adapter  # noqa: E402
+
+
+def synthetic_doc(i: int) -> dict:
+    location = {"city": f"City {i % 50}", "state": "CA", "country": "USA", "geolocation": "34.05,-118.24"}
+    return {
+        "_id": ObjectId(),
+        "filename": f"item-{i}.pdf",
+        "contributor": {"name": f"Contributor {i}", "age_bucket": "18-24", "gender": None, "ethnicity": "n/a",
+                        "nationality": "American", "languages_spoken": ["English", "Spanish"], "occupation": "Student"},
+        "folklore": {"item": f"Item {i}", "genre": ["Joke", "Legend", "Proverb"][i % 3], "language_of_origin": "English",
+                     "medium": "Oral", "translation": None, "place_mentioned": [location]},
+        "collector": {"name": f"Collector {i % 20}", "gender": None, "collector_comments": "Fall 2023"},
+        "analysis": {"context": {"use_context": "Told at dinner", "cultural_background": "Family tradition",
+                                 "collection_context": "In person"},
+                     "interpretation": "A cautionary tale " * 20, "collector_comments": None},
+        "storage_medium": "PDF",
+        "cleaned_full_text": "Once upon a time there was a story worth telling. " * 60,
+        "date_collected": "2023-10-01",
+        "location_collected": location,
+    }
+
+
+def project(doc: dict, projection: dict) -> dict:
+    out = {"_id": doc["_id"]}
+    for path in projection:
+        head, _, rest = path.partition(".")
+        if rest:
+            out.setdefault(head, {})[rest] = doc[head][rest]
+        else:
+            out[head] = doc[head]
+    return out
+
+
+def timed(fn, rounds: int) -> tuple:
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+
+def run(n: int, rounds: int):
+    views = {
+        "full": ([synthetic_doc(i) for i in range(n)], full_list_adapter),
+        "summary": ([project(synthetic_doc(i), SUMMARY_PROJECTION) for i in range(n)], summary_list_adapter),
+    }
+    print(f"{n} documents, mean of {rounds} rounds")
+    for view, (docs, adapter) in views.items():
+        validated_ms, validated = timed(lambda: adapter.dump_json(adapter.validate_python(docs), by_alias=True), rounds)
+        fast_ms, fast = timed(lambda: encode_documents(docs), rounds)
+        print(f"{view:8} validated {validated_ms:8.2f} ms   orjson {fast_ms:8.2f} ms   "
+              f"speedup {validated_ms / fast_ms:5.1f}x   {len(fast) / 1024:.0f} KiB")
+        codecs = {"gzip": lambda: gzip.compress(fast, compresslevel=GZIP_LEVEL, mtime=0)}
+        if brotli:
+            codecs["br"] = lambda: brotli.compress(fast, quality=BROTLI_QUALITY)
+        for name, codec in codecs.items():
+            ms, body = timed(codec, rounds)
+            print(f"{'':8} {name:9} {ms:8.2f} ms   ratio {len(fast) / len(body):5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    run(args.docs, args.rounds)
@@ -0,0 +1,251 @@
+"""Local stand-ins for the services the archive API talks to, used by benchmarks/loadtest.py.
+
+- a synthetic, seeded FolkloreCollection corpus (deterministic ids, filenames and random keys)
+- an async adapter over mongomock, for runs without a local mongod
+- a stub OIDC provider serving JWKS, token exchange and profile endpoints
+"""
+import base64
+import random
+import socket
+import threading
+import time
+from typing import Iterator, List
+
+import mongomock
+import uvicorn
+from bson import ObjectId
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from jose import jwt
+from pymongo.errors import OperationFailure
+from pymongo.results import UpdateResult
+
+from app.indexes import ARCHIVE_INDEXES
+from app.random_selection import RANDOM_KEY
+
+GEOGRAPHIES = ["Africa", "Asia", "Europe", "Latin America", "Middle East", "North America", "Oceania"]
+GENRES = ["Belief", "Custom", "Joke", "Legend", "Proverb", "Riddle", "Song"]
+SUB_CATEGORIES = ["Family", "Food", "Holiday", "Religion", "School", "Sports", "Work"]
+# Variant spellings fold onto one value through the Thesaurus, as in the real archive
+LANGUAGES = {"English": ["English", "english"], "Spanish": ["Spanish", "spanish", "Español"],
+             "Mandarin": ["Mandarin", "Chinese"], "Hindi": ["Hindi"], "Tagalog": ["Tagalog", "Filipino"]}
+WORDS = "once upon time there grandmother told story about village river moon harvest luck spirit".split()
+
+# --- corpus ---
+
+def document_id(i: int) -> ObjectId:
+    return ObjectId(f"{i + 1:024x}")
+
+def pdf_name(i: int, pdf_count: int) -> str:
+    return f"bench-{i % pdf_count:05d}.pdf"
+
+def synthetic_record(i: int, seed: int, pdf_count: int) -> dict:
+    rng = random.Random(seed * 1_000_003 + i)
+    genre = rng.choice(GENRES)
+    language = rng.choice(rng.choice(list(LANGUAGES.values())))
+    location = {"city": f"City {rng.randrange(200)}", "state": None, "country": rng.choice(GEOGRAPHIES),
+                "geolocation": f"{rng.uniform(-60, 60):.4f},{rng.uniform(-180, 180):.4f}"}
+    archive_index = {"geography": rng.choice(GEOGRAPHIES), "genre": genre, "sub_category_1": rng.choice(SUB_CATEGORIES)}
+    if rng.random() < 0.5:
+        archive_index["sub_category_2"] = rng.choice(SUB_CATEGORIES)
+    return {
+        "_id": document_id(i),
+        "filename": pdf_name(i, pdf_count),
+        "contributor": {"name": f"Contributor {i}", "age_bucket": rng.choice(["18-24", "25-34", "35-44", "65+"]),
+                        "gender": rng.choice(["F", "M", None]), "ethnicity": "n/a", "nationality": None,
+                        "languages_spoken": [language], "occupation": rng.choice(["Student", None])},
+        "folklore": {"item": f"Item {i}", "genre": genre, "language_of_origin": language, "medium": "Oral",
+                     "translation": None, "place_mentioned": [location]},
+        "collector": {"name": f"Collector {rng.randrange(100)}", "gender": None, "collector_comments": "Fall"},
+        "analysis": {"context": {"use_context": None, "cultural_background": None, "collection_context": None},
+                     "interpretation": " ".join(rng.choices(WORDS, k=40)), "collector_comments": None},
+        "storage_medium": "PDF",
+        "cleaned_full_text": " ".join(rng.choices(WORDS, k=rng.randrange(100, 600))),
+        "date_collected": f"20{rng.randrange(10, 25)}-{rng.randrange(1, 13):02d}-01",
+        "location_collected": location,
+        "archive_index": archive_index,
+        RANDOM_KEY: rng.random(),
+    }
+
+def thesaurus_entries() -> List[dict]:
+    entries = [{"type": "genre", "maps_to": genre, "maps_from": [genre]} for genre in GENRES]
+    entries += [{"type": "language_of_origin", "maps_to": name, "maps_from": variants} for name, variants in LANGUAGES.items()]
+    return entries
+
+def record_batches(docs: int, seed: int, pdf_count: int, batch_size: int) -> Iterator[List[dict]]:
+    for start in range(0, docs, batch_size):
+        yield [synthetic_record(i, seed, pdf_count) for i in range(start, min(start + batch_size, docs))]
+
+# Replaces Archive and Thesaurus in a sync pymongo or mongomock database
+def seed_database(database, docs: int, seed: int, pdf_count: int, batch_size: int = 10000):
+    database["Archive"].drop()
+    database["Thesaurus"].drop()
+    for batch in record_batches(docs, seed, pdf_count, batch_size):
+        database["Archive"].insert_many(batch, ordered=False)
+    database["Thesaurus"].insert_many(thesaurus_entries())
+    # Built up front so the measured run doesn't overlap the app's own index builds
+    for name, keys in ARCHIVE_INDEXES.items():
+        database["Archive"].create_index(keys, name=name)
+
+def placeholder_pdf(size: int) -> bytes:
+    header = b"%PDF-1.4\n% benchmark placeholder\n"
+    return header + b"0" * max(size - len(header) - 6, 0) + b"\n%%EOF"
+
+def seed_bucket(s3, bucket: str, pdf_count: int, pdf_size: int):
+    s3.create_bucket(Bucket=bucket)
+    body = placeholder_pdf(pdf_size)
+    for i in range(pdf_count):
+        s3.put_object(Bucket=bucket, Key=pdf_name(i, pdf_count), Body=body, ContentType="application/pdf")
+
+# --- mongomock behind the AsyncMongoClient API the app uses ---
+
+class MongomockCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._iter = None
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, n):
+        self._cursor = self._cursor.skip(n)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+    def __aiter__(self):
+        self._iter = iter(self._cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        pass
+
+class MongomockCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, filter=None, projection=None, batch_size=None, **kwargs):
+        kwargs.pop("hint", None)
+        return MongomockCursor(self._collection.find(filter, projection, **kwargs))
+
+    async def aggregate(self, pipeline, batchSize=None, **kwargs):
+        if any("$search" in stage or "$searchMeta" in stage for stage in pipeline):
+            raise OperationFailure("$search requires Atlas, use --mongo-uri with an Atlas deployment")
+        return MongomockCursor(iter(list(self._collection.aggregate(pipeline))))
+
+    # No replica set, so the app falls back to ttl-based cache expiry
+    async def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", 40573)
+
+    async def update_many(self, filter, update, **kwargs):
+        if isinstance(update, list):
+            # Only the random key backfill uses a pipeline update, mongomock lacks $rand
+            ids = [doc["_id"] for doc in self._collection.find(filter, {"_id": 1})]
+            for _id in ids:
+                self._collection.update_one({"_id": _id}, {"$set": {RANDOM_KEY: random.random()}})
+            return UpdateResult({"n": len(ids), "nModified": len(ids)}, acknowledged=True)
+        return self._collection.update_many(filter, update, **kwargs)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+class MongomockDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return MongomockCollection(self._database[name])
+
+    async def command(self, *args, **kwargs):
+        raise OperationFailure("explain is not supported by mongomock")
+
+class MongomockClient:
+    def __init__(self, database):
+        self._database = MongomockDatabase(database)
+
+    def __getitem__(self, name):
+        return self._database
+
+    async def close(self):
+        pass
+
+def mongomock_database():
+    return mongomock.MongoClient().archive_benchmark
+
+# --- stub OIDC provider ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def b64url_uint(value: int) -> str:
+    return base64.urlsafe_b64encode(value.to_bytes((value.bit_length() + 7) // 8, "big")).rstrip(b"=").decode()
+
+# Issues RS256 id tokens for any authorization code and serves the matching JWKS
+class StubIdp:
+    KID = "benchmark"
+
+    def __init__(self, audience: str, token_ttl: int = 3600):
+        self.audience = audience
+        self.token_ttl = token_ttl
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._private_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        numbers = key.public_key().public_numbers()
+        self.jwk = {"kty": "RSA", "kid": self.KID, "use": "sig", "alg": "RS256",
+                    "n": b64url_uint(numbers.n), "e": b64url_uint(numbers.e)}
+        self.jwks_requests = 0
+        self.app = FastAPI()
+        self.app.get("/jwks")(self.jwks)
+        self.app.post("/oidcAccessToken")(self.token)
+        self.app.get("/oidcProfile")(self.profile)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning"))
+
+    async def jwks(self):
+        self.jwks_requests += 1
+        return {"keys": [self.jwk]}
+
+    async def token(self):
+        now = int(time.time())
+        claims = {"iss": self.url, "aud": self.audience, "sub": "benchmark-user", "iat": now, "exp": now + self.token_ttl}
+        id_token = jwt.encode(claims, self._private_pem.decode(), algorithm="RS256", headers={"kid": self.KID})
+        return {"access_token": f"access-{now}", "id_token": id_token, "token_type": "Bearer"}
+
+    async def profile(self):
+        return {"sub": "benchmark-user", "name": "Benchmark User"}
+
+    def start(self):
+        threading.Thread(target=self._server.run, daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.01)
+
+    def stop(self):
+        self._server.should_exit = True